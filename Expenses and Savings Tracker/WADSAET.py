@@ -1,10 +1,53 @@
+import argparse
+import atexit
+import calendar
+import csv
 import json
+import math
+import mmap
+import operator
 import os
 import random
 import re
+import sqlite3
+import struct
+import sys
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+from urllib.parse import quote
 
+try:
+    import numpy as np  # Optional: vectorized analytics for big columnar histories
+except ImportError:
+    np = None
+
+try:
+    import fcntl  # File locking on POSIX
+    msvcrt = None
+except ImportError:
+    fcntl = None
+    import msvcrt  # ... and on Windows
+
+STORAGE_BACKEND = "json"  # "json", "sqlite", "sharded" or "binary"
 DATA_FILE = "data.json"
+SQLITE_FILE = "data.db"
+USERS_FILE = "users.json"  # Account index used by the sharded backend
+SHARD_DIR = "shards"  # One transactions file per user for the sharded backend
+JOURNAL_FILE = "data.journal"
+LOCK_FILE = "data.lock"  # Held while reading or writing the data files
+SEARCH_DIR = "search"  # Saved description search indexes, one file per user
+ROLLUP_DIR = "rollups"  # Saved monthly totals, one file per user
+USE_JOURNAL = True  # Append one line per change instead of rewriting data.json
+JOURNAL_COMPACT_AT = 500  # Fold the journal back into data.json after this many entries
+SAVE_DELAY = 2.0  # Seconds of changes batched into one write; 0 writes every change
+COLUMNAR = False  # Keep transactions in compact typed arrays instead of dicts
+NUMPY_MIN_ROWS = 2000  # Below this many rows plain Python beats NumPy's per-call overhead
 
 # Simple color helpers (works on most terminals, no external deps)
 class C:
@@ -28,69 +71,2543 @@ AMOUNT_WIDTH = 12
 CATEGORY_WIDTH = 20
 DESC_WIDTH = 25
 
+EXPENSE_CATEGORIES = ["Food & Groceries", "Transportation", "Entertainment", "Personal Needs", "Personal Wants", "Health & Fitness", "Bills", "School/Work"]
+INCOME_CATEGORIES = ["Allowance", "Work", "Reward", "Gift"]
+CATEGORIES = {"Expense": EXPENSE_CATEGORIES, "Income": INCOME_CATEGORIES}
+
 
 def color(text, *styles):
     if not styles:
         return text
     return "".join(styles) + str(text) + C.RESET
 
+# --- Text layout ---
+# Widths are measured in terminal columns: escape sequences take none, wide
+# and full-width characters (most emoji) take two, combining marks and
+# zero-width joiners/variation selectors take none. Widths and padded cells
+# are memoized because the dashboard lays out the same strings on every
+# redraw.
+ANSI_ESCAPE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+ANSI_TOKENS = re.compile(f"({ANSI_ESCAPE.pattern})")  # Splits text into plain runs and escapes
+ZERO_WIDTH = {"\u200b", "\u200c", "\u200d", "\ufe0e", "\ufe0f"}
+
 def strip_ansi(s):
-    import re
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', s)
+    return ANSI_ESCAPE.sub('', s)
 
-def truncate_to_display_width(text, width):
+@lru_cache(maxsize=None)
+def char_width(ch):
+    if ch in ZERO_WIDTH or unicodedata.combining(ch):
+        return 0
+    return 2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1
+
+@lru_cache(maxsize=4096)
+def display_width(text):
     plain = strip_ansi(text)
-    if len(plain) <= width:
+    if plain.isascii():
+        return len(plain)
+    return sum(char_width(ch) for ch in plain)
+
+@lru_cache(maxsize=4096)
+def truncate_to_display_width(text, width):
+    if display_width(text) <= width:
         return text
-    # Truncate plain to width, then find corresponding index in text
-    truncated_plain = plain[:width]
-    idx = 0
-    plain_idx = 0
-    while plain_idx < len(truncated_plain) and idx < len(text):
-        if text[idx] == '\x1B':
-            # Skip ANSI sequence
-            idx += 1
-            while idx < len(text) and text[idx] != 'm':
-                idx += 1
-            if idx < len(text):
-                idx += 1
-        else:
-            plain_idx += 1
-            idx += 1
-    return text[:idx]
+    # Characters are kept until one would not fit; escape sequences are all
+    # kept, so a color opened before the cut is still reset after it
+    parts = []
+    used = 0
+    for i, part in enumerate(ANSI_TOKENS.split(text)):
+        if i % 2:
+            parts.append(part)
+            continue
+        for ch in part:
+            used += char_width(ch)
+            if used > width:
+                break
+            parts.append(ch)
+    return "".join(parts)
 
+@lru_cache(maxsize=4096)
 def pad_to_display_width(text, width):
-    plain = strip_ansi(text)
-    if len(plain) >= width:
-        return truncate_to_display_width(text, width)
-    padding = width - len(plain)
-    return text + ' ' * padding
+    if display_width(text) > width:
+        text = truncate_to_display_width(text, width)
+    return text + ' ' * (width - display_width(text))
+
+# --- Screen ---
+# Screens are cleared by writing ANSI escapes to stdout instead of running
+# cls/clear in a subprocess. Windows consoles only understand them once
+# virtual terminal processing is switched on, which enable_ansi() does once
+# at startup; consoles too old for it fall back to cls.
+CLEAR_SCREEN = "\033[H\033[2J\033[3J"  # Cursor home, clear screen, clear scrollback
+ansi_enabled = True
+
+def enable_ansi():
+    global ansi_enabled
+    if os.name != "nt":
+        return
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+            ansi_enabled = bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+        # Otherwise output is redirected and escapes pass through untouched
+    except (AttributeError, OSError):
+        ansi_enabled = False
+
+# Screens print through a Frame instead of straight to stdout: lines (and
+# the screen clear before them) pile up in one buffer that goes out in a
+# single write when the screen next waits for input, so a long history is
+# drawn at once instead of scrolling into view line by line.
+class Frame:
+    def __init__(self):
+        self.parts = []
+
+    def print(self, *values, sep=" ", end="\n"):
+        self.parts.append(sep.join(map(str, values)) + end)
+
+    def clear(self):
+        # Anything still pending would be wiped straight away anyway
+        self.parts = []
+        if ansi_enabled:
+            self.parts.append(CLEAR_SCREEN)
+        else:
+            os.system("cls")
+
+    def flush(self):
+        if self.parts:
+            sys.stdout.write("".join(self.parts))
+            self.parts = []
+        sys.stdout.flush()
+
+    def input(self, prompt=""):
+        self.flush()
+        return input(prompt)
+
+screen = Frame()
 
 # --- Helper Functions ---
 def clear_terminal():
-    os.system("cls" if os.name == "nt" else "clear")
-    # On Windows cmd, enable ANSI if possible (best-effort)
+    screen.clear()
+
+def load_data():
+    if STORAGE_BACKEND == "sqlite":
+        storage = SqliteStorage(SQLITE_FILE)
+    elif STORAGE_BACKEND == "sharded":
+        storage = ShardedStorage()
+    elif STORAGE_BACKEND == "binary":
+        storage = BinaryStorage()
+    else:
+        storage = JsonStorage()
+    data = storage.load()
+    data["_storage"] = storage
+    index_emails(data)
+    return data
+
+def index_emails(data):
+    # Email -> username, so logging in by email is a lookup instead of a scan
+    data["_emails"] = {}
+    for username, info in data["users"].items():
+        data["_emails"].setdefault(info["email"], username)
+
+# Several processes may share the data files (the app and command-line runs
+# from scripts or cron), so the backends read and write them only while
+# holding data_lock, an exclusive lock on LOCK_FILE. A process that finds
+# the files changed since it last read or wrote them reloads what is on
+# disk and re-applies its own unwritten changes on top before writing (see
+# JsonStorage.catch_up and ShardedStorage.flush); the caches built from the
+# old state are dropped.
+class DataLock:
+    # Re-entrant within a process, so a command-line run can hold it from
+    # load to the last flush
+    def __init__(self):
+        self.file = None
+        self.depth = 0
+
+    def __enter__(self):
+        if self.depth == 0:
+            file = open(LOCK_FILE, "a+b")
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        file.seek(0)
+                        msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK gives up after 10 seconds; keep waiting
+            self.file = file
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.file.close()
+            self.file = None
+
+data_lock = DataLock()
+
+def file_stamps(paths):
+    # Changes whenever one of the files is written or replaced
+    stamps = []
+    for path in paths:
+        try:
+            info = os.stat(path)
+            stamps.append([info.st_size, info.st_mtime_ns, info.st_ino])
+        except OSError:
+            stamps.append(None)
+    return stamps
+
+# Everything built from a user's records, dropped when they are reloaded
+USER_CACHES = ("_aggregates", "_groups", "_queries", "_search", "_rollups", "_date_index", "_id_index")
+
+def drop_user_caches(data, username=None):
+    # One user's, or everyone's when username is None
+    for cache in USER_CACHES:
+        if username is None:
+            data.pop(cache, None)
+        else:
+            data.get(cache, {}).pop(username, None)
+
+# Changes are written behind: commit_change() applies them in memory right
+# away, and the backend writes them out once SAVE_DELAY seconds have passed
+# since the first unsaved one, or sooner when flush_changes() is called
+# (leaving the add/edit/delete screens, logging out and exiting).
+def commit_change(data, entry):
+    username = entry["user"]
+    data.get("_groups", {}).pop(username, None)
+    if entry["op"] != "user" and any(username in data.get(cache, ()) for cache in ("_aggregates", "_queries", "_search", "_rollups")):
+        # The caches are updated before the change reaches storage, while
+        # the old records can still be looked up (once, for all of them)
+        removed, added = touched_records(data, entry)
+        aggregates = data.get("_aggregates", {}).get(username)
+        if aggregates is not None:
+            update_aggregates(aggregates, entry, removed, added)
+        invalidate_queries(data, entry, removed, added)
+        update_search(data, entry, removed, added)
+        update_rollups(data, entry, removed, added)
+    data["_storage"].commit(data, entry)
+    if entry["op"] == "user":
+        data["_emails"].setdefault(entry["email"], entry["user"])
+    data.setdefault("_unsaved_since", time.monotonic())
+    if time.monotonic() - data["_unsaved_since"] >= SAVE_DELAY:
+        flush_changes(data)
+
+def touched_records(data, entry):
+    # (records a change removes, records it adds); an edit removes the old
+    # version and adds the new one
+    username = entry["user"]
+    op = entry["op"]
+    if op == "add":
+        return [], [entry["record"]]
+    if op == "import":
+        return [], entry["records"]
+    if op == "edit":
+        old = get_transaction(data, username, entry["id"])
+        return ([old], [dict(old, **entry["changes"])]) if old else ([], [])
+    if op == "delete":
+        return [t for t in (get_transaction(data, username, tid) for tid in entry["ids"]) if t], []
+    return [], []  # Clear
+
+def flush_changes(data):
+    if "_unsaved_since" in data:
+        data["_storage"].flush(data)
+        del data["_unsaved_since"]
+        # The files' stamps changed, so every loaded index is saved again
+        data.setdefault("_rollups_unsaved", set()).update(data.get("_rollups", ()))
+    # Only once the data files hold every change the rollups have seen
+    save_rollups(data)
+
+def write_atomic(path, write, mode="w", **options):
+    # Written next to the target and renamed over it, so a crash leaves
+    # either the old file or the new one, never a truncated one. Returns
+    # what write() returned.
+    temp = path + ".tmp"
+    with open(temp, mode, **options) as file:
+        result = write(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, path)
+    return result
+
+def write_json_atomic(path, value, **options):
+    write_atomic(path, lambda file: json.dump(value, file, **options))
+
+# --- Queries ---
+# Screens ask the storage backend for transactions and totals instead of
+# walking data["transactions"] themselves, so the SQLite backend can answer
+# them with indexed queries.
+def find_transactions(data, username, **filters):
+    return list(cached_query(data, username, filters)["records"])
+
+def filtered_totals(data, username, **filters):
+    # Income/Expense totals of what find_transactions(**filters) returns
+    query = cached_query(data, username, filters)
+    if query["totals"] is None:
+        query["totals"] = aggregate(query["records"])["types"]
+    return query["totals"]
+
+def iter_transactions(data, username, **filters):
+    # Like find_transactions(), but yields the records one at a time
+    return data["_storage"].stream(data, username, **filters)
+
+def get_transaction(data, username, tid):
+    return data["_storage"].get(data, username, tid)
+
+def recent_transactions(data, username, num):
+    return data["_storage"].recent(data, username, num)
+
+def count_transactions(data, username):
+    return data["_storage"].count(data, username)
+
+# Transaction IDs come from a per-user counter saved with the account
+# ("next_id"), so they never repeat after a delete. Accounts saved before the
+# counter existed start from their highest ID + 1.
+def next_transaction_id(data, username):
+    info = data["users"][username]
+    if "next_id" not in info:
+        highest = data["_storage"].max_id(data, username)
+        info.setdefault("next_id", highest + 1)  # Loading a shard may have set it already
+    return info["next_id"]
+
+def bump_next_id(data, username, tid):
+    info = data["users"].get(username)
+    if info is not None:
+        info["next_id"] = max(info.get("next_id", 1), tid + 1)
+
+# Totals over everything or over a single date come straight from the
+# aggregate cache; other filters fall through to the storage backend.
+def type_totals(data, username, **filters):
+    if set(filters) <= {"date"}:
+        aggregates = get_aggregates(data, username)
+        if "date" in filters:
+            day = aggregates["days"].get(filters["date"])
+            return bucket_totals(day["types"] if day else {})
+        return bucket_totals(aggregates["types"])
+    groups = data["_storage"].totals(data, username, None, **filters)
+    return groups.get(None, {"Income": 0, "Expense": 0})
+
+def category_totals(data, username, type_, **filters):
+    if set(filters) <= {"date"}:
+        aggregates = get_aggregates(data, username)
+        if "date" in filters:
+            day = aggregates["days"].get(filters["date"])
+            buckets = day["categories"] if day else {}
+        else:
+            buckets = aggregates["categories"]
+        return {cat: bucket[0] / 100 for (t, cat), bucket in buckets.items() if t == type_}
+    groups = data["_storage"].totals(data, username, "category", type_=type_, **filters)
+    return {cat: sums[type_] for cat, sums in groups.items()}
+
+def daily_totals(data, username, **filters):
+    if set(filters) <= {"start", "end"}:
+        days = get_aggregates(data, username)["days"]
+        start = filters.get("start")
+        end = filters.get("end")
+        if start and end:
+            # Look up each day of a bounded window instead of walking every day
+            first = datetime.strptime(start, "%Y-%m-%d").date()
+            last = datetime.strptime(end, "%Y-%m-%d").date()
+            dates = [(first + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((last - first).days + 1)]
+            dates = [d for d in dates if d in days]
+        else:
+            dates = [d for d in days if (not start or d >= start) and (not end or d <= end)]
+        return {d: bucket_totals(days[d]["types"]) for d in dates}
+    return data["_storage"].totals(data, username, "date", **filters)
+
+# --- Query cache ---
+# find_transactions() results are kept per user in an LRU cache keyed by
+# the filters, along with their totals once filtered_totals() asks, so
+# going back to a filter seen before skips the scan. commit_change() drops
+# only the entries whose filters match a record the change touches (before
+# or after an edit, or that an import adds); clearing drops the user's whole
+# cache. Only filtered results of up to QUERY_CACHE_MAX_ROWS records are
+# kept, so on SQLite the cache never holds a whole history as dicts; the
+# unfiltered listing is better streamed with iter_transactions().
+# query_cache_stats() reports hits, misses, evictions and invalidations.
+# Filter expressions (see compile_filter) are cached the same way, keyed by
+# their compiled form.
+QUERY_CACHE_SIZE = 32
+QUERY_CACHE_MAX_ROWS = 2000
+
+def query_stats(data):
+    return data.setdefault("_query_stats", {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0})
+
+def query_cache_stats(data):
+    return dict(query_stats(data), size=sum(len(cache) for cache in data.get("_queries", {}).values()))
+
+def cached_query(data, username, filters, plan=None):
+    stats = query_stats(data)
+    cache = data.setdefault("_queries", {}).setdefault(username, OrderedDict())
+    key = tuple(sorted((name, value) for name, value in filters.items() if value is not None))
+    if key in cache:
+        cache.move_to_end(key)
+        stats["hits"] += 1
+        return cache[key]
+    stats["misses"] += 1
+    if plan is not None:
+        records = data["_storage"].query(data, username, plan)
+    else:
+        records = data["_storage"].find(data, username, **filters)
+    query = {"records": records, "totals": None, "plan": plan}
+    if all(name == "order" for name, _ in key) or len(records) > QUERY_CACHE_MAX_ROWS:
+        return query
+    cache[key] = query
+    if len(cache) > QUERY_CACHE_SIZE:
+        cache.popitem(last=False)
+        stats["evictions"] += 1
+    return query
+
+def invalidate_queries(data, entry, removed, added):
+    cache = data.get("_queries", {}).get(entry["user"])
+    if not cache:
+        return
+    touched = None if entry["op"] == "clear" else removed + added
+    stale = []
+    for key, query in cache.items():
+        if query["plan"] is not None:
+            matches = query["plan"]["predicate"]
+        else:
+            filters = {name: value for name, value in key if name != "order"}
+            matches = lambda t: matches_filters(t, **filters)
+        if touched is None or any(matches(t) for t in touched):
+            stale.append(key)
+    for key in stale:
+        del cache[key]
+    query_stats(data)["invalidations"] += len(stale)
+
+# --- Filter expressions ---
+# A small query language for history filters, e.g.
+#   category = Transportation and amount > 100 and date >= today-3m
+#   category in ("Food & Groceries", Bills) or description ~ coffee
+# Fields are date, type, category, amount, description and id; operators
+# are = != < <= > >=, "in (...)", "between X and Y" and "~" (text contains,
+# ignoring case), combined with and/or/not and parentheses. Dates may be
+# YYYY-MM-DD, today, yesterday or today-N followed by d/w/m/y. Text with
+# spaces goes in quotes.
+#
+# compile_filter() turns an expression into a plan: one fused predicate for
+# the whole expression, the date range and IDs its top-level "and" pins down
+# (so the in-memory backends can start from the date or ID index instead of
+# every record), and for SQLite an equivalent WHERE clause.
+FILTER_TOKEN = re.compile(r"""\s*(?:(?P<string>"[^"]*"|'[^']*')|(?P<op><=|>=|!=|=|<|>|~|\(|\)|,)|(?P<word>[^\s()<>=!~,"']+))""")
+FILTER_FIELDS = ("date", "type", "category", "amount", "description", "id")
+FILTER_OPS = {"=": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+RELATIVE_DATE = re.compile(r"(today|yesterday)(?:([+-])(\d+)([dwmy]))?")
+
+def filter_tokens(text):
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = FILTER_TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"unexpected {text[pos:].strip()[:10]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        tokens.append((kind, value[1:-1] if kind == "string" else value))
+        pos = match.end()
+    return tokens
+
+def filter_date(value):
+    match = RELATIVE_DATE.fullmatch(value.lower())
+    if not match:
+        try:
+            # isoformat() pads years before 1000, which strftime() may not
+            return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+        except ValueError:
+            raise ValueError(f"invalid date {value!r}")
+    day = datetime.now().date() - timedelta(days=1 if match.group(1) == "yesterday" else 0)
+    if match.group(2):
+        n = int(match.group(3)) * (1 if match.group(2) == "+" else -1)
+        unit = match.group(4)
+        try:
+            if unit in "dw":
+                day += timedelta(days=n * (7 if unit == "w" else 1))
+            else:
+                # Calendar months and years, clamped to the end of shorter months
+                months = day.year * 12 + day.month - 1 + n * (12 if unit == "y" else 1)
+                year, month = divmod(months, 12)
+                day = day.replace(year=year, month=month + 1, day=min(day.day, calendar.monthrange(year, month + 1)[1]))
+        except (OverflowError, ValueError):
+            raise ValueError(f"date {value!r} is out of range")
+    return day.isoformat()
+
+def filter_value(field, value):
+    # Values in the form records are compared in: date strings, cents for
+    # amounts, ints for IDs and the canonical spelling of types/categories
+    if field == "date":
+        return filter_date(value)
+    if field == "amount":
+        try:
+            return to_cents(float(value))
+        except (OverflowError, ValueError):  # Also inf and nan
+            raise ValueError(f"invalid amount {value!r}")
+    if field == "id":
+        if not value.isdigit():
+            raise ValueError(f"invalid id {value!r}")
+        return int(value)
+    if field == "type":
+        for type_ in CATEGORIES:
+            if type_.lower() == value.lower():
+                return type_
+        raise ValueError(f"unknown type {value!r}")
+    if field == "category":
+        return next((cat for cats in CATEGORIES.values() for cat in cats if cat.lower() == value.lower()), value)
+    return value
+
+class FilterParser:
+    # Recursive descent over the tokens into a tree of tuples:
+    # ("or", [...]), ("and", [...]), ("not", node), (op, field, value),
+    # ("in", field, values) and ("between", field, low, high)
+    def __init__(self, text):
+        self.tokens = filter_tokens(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def keyword(self, word):
+        kind, value = self.peek()
+        if kind == "word" and value.lower() == word:
+            self.pos += 1
+            return True
+        return False
+
+    def take(self, *kinds):
+        kind, value = self.peek()
+        if kind not in kinds:
+            raise ValueError(f"expected a value, got {value!r}" if value else "unexpected end of filter")
+        self.pos += 1
+        return value
+
+    def expect(self, op):
+        if self.peek() != ("op", op):
+            raise ValueError(f"expected {op!r}")
+        self.pos += 1
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("empty filter")
+        node = self.either()
+        if self.pos < len(self.tokens):
+            raise ValueError(f"unexpected {self.tokens[self.pos][1]!r}")
+        return node
+
+    def either(self):
+        nodes = [self.both()]
+        while self.keyword("or"):
+            nodes.append(self.both())
+        return nodes[0] if len(nodes) == 1 else ("or", nodes)
+
+    def both(self):
+        nodes = [self.negation()]
+        while self.keyword("and"):
+            nodes.append(self.negation())
+        return nodes[0] if len(nodes) == 1 else ("and", nodes)
+
+    def negation(self):
+        if self.keyword("not"):
+            return ("not", self.negation())
+        if self.peek() == ("op", "("):
+            self.pos += 1
+            node = self.either()
+            self.expect(")")
+            return node
+        return self.comparison()
+
+    def comparison(self):
+        field = self.take("word").lower()
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"unknown field {field!r} (use {', '.join(FILTER_FIELDS)})")
+        if self.keyword("in"):
+            self.expect("(")
+            values = [filter_value(field, self.take("word", "string"))]
+            while self.peek() == ("op", ","):
+                self.pos += 1
+                values.append(filter_value(field, self.take("word", "string")))
+            self.expect(")")
+            return ("in", field, tuple(values))
+        if self.keyword("between"):
+            low = filter_value(field, self.take("word", "string"))
+            if not self.keyword("and"):
+                raise ValueError("expected 'and' after between")
+            return ("between", field, low, filter_value(field, self.take("word", "string")))
+        op = self.take("op")
+        if op == "~":
+            if field != "description":
+                raise ValueError("~ only works on description")
+            return ("~", field, self.take("word", "string").lower())
+        if op not in FILTER_OPS:
+            raise ValueError(f"unexpected {op!r}")
+        return (op, field, filter_value(field, self.take("word", "string")))
+
+def filter_getter(field):
+    if field == "amount":
+        return amount_cents
+    return operator.itemgetter(field)
+
+def filter_predicate(node):
+    kind = node[0]
+    if kind in ("and", "or"):
+        parts = [filter_predicate(child) for child in node[1]]
+        if kind == "and":
+            return lambda t: all(part(t) for part in parts)
+        return lambda t: any(part(t) for part in parts)
+    if kind == "not":
+        part = filter_predicate(node[1])
+        return lambda t: not part(t)
+    get = filter_getter(node[1])
+    if kind == "in":
+        values = set(node[2])
+        return lambda t: get(t) in values
+    if kind == "between":
+        low, high = node[2], node[3]
+        return lambda t: low <= get(t) <= high
+    if kind == "~":
+        needle = node[2]
+        return lambda t: needle in str(get(t)).lower()
+    compare = FILTER_OPS[kind]
+    value = node[2]
+    return lambda t: compare(get(t), value)
+
+def filter_sql(node):
+    # (WHERE clause, parameters) matching filter_predicate(node)
+    kind = node[0]
+    if kind in ("and", "or"):
+        parts = [filter_sql(child) for child in node[1]]
+        return f" {kind.upper()} ".join(f"({sql})" for sql, _ in parts), [p for _, params in parts for p in params]
+    if kind == "not":
+        sql, params = filter_sql(node[1])
+        return f"NOT ({sql})", params
+    column = "CAST(ROUND(amount * 100) AS INTEGER)" if node[1] == "amount" else node[1]
+    if kind == "in":
+        return f"{column} IN ({', '.join('?' * len(node[2]))})", list(node[2])
+    if kind == "between":
+        return f"{column} BETWEEN ? AND ?", [node[2], node[3]]
+    if kind == "~":
+        pattern = re.sub(r"([%_\\])", r"\\\1", node[2])
+        return f"{column} LIKE ? ESCAPE '\\'", [f"%{pattern}%"]
+    return f"{column} {'<>' if kind == '!=' else kind} ?", [node[2]]
+
+def filter_bounds(node):
+    # Date range and ID set every match must fall in, from the comparisons
+    # joined by the top-level "and" (None where unconstrained)
+    start = end = ids = None
+    for part in node[1] if node[0] == "and" else [node]:
+        kind = part[0]
+        if kind in ("and", "or", "not"):
+            continue
+        field = part[1]
+        if field == "date":
+            low = high = None
+            if kind in ("=", ">=", "between"):
+                low = part[2]
+            elif kind == ">":
+                low = shift_date(part[2], 1)
+            elif kind == "in":
+                low = min(part[2])
+            if kind in ("=", "<="):
+                high = part[2]
+            elif kind == "<":
+                high = shift_date(part[2], -1)
+            elif kind == "between":
+                high = part[3]
+            elif kind == "in":
+                high = max(part[2])
+            if low and (start is None or low > start):
+                start = low
+            if high and (end is None or high < end):
+                end = high
+        elif field == "id" and kind in ("=", "in"):
+            values = {part[2]} if kind == "=" else set(part[2])
+            ids = values if ids is None else ids & values
+    return start, end, ids
+
+def shift_date(date, days):
     try:
-        if os.name == "nt":
-            os.system("")
+        return (datetime.strptime(date, "%Y-%m-%d").date() + timedelta(days=days)).isoformat()
+    except OverflowError:
+        # Past either end of the calendar: a bound no date string can reach
+        return date + "~" if days > 0 else date[:-1] + "0"
+
+def compile_filter(text):
+    # Raises ValueError with a readable message for a malformed expression
+    node = FilterParser(text).parse()
+    start, end, ids = filter_bounds(node)
+    sql, params = filter_sql(node)
+    return {"key": repr(node), "predicate": filter_predicate(node), "start": start, "end": end,
+            "ids": sorted(ids) if ids is not None else None, "sql": sql, "params": params}
+
+def query_transactions(data, username, expression):
+    plan = compile_filter(expression)
+    return list(cached_query(data, username, {"where": plan["key"]}, plan)["records"])
+
+# --- Description search ---
+# An inverted index from the words of each user's descriptions to the IDs
+# of the transactions using them. Words are kept sorted as well, so a
+# prefix ("groc") is a bisect range. commit_change() keeps a loaded index up
+# to date, and on logout and exit (after the last flush) it is saved to
+# SEARCH_DIR/<user>.json with the size and modification time of the
+# backend's data files, so a busy session writes it once rather than on
+# every flush. A saved index whose files have changed since (a crash before
+# it was saved, or another user's save to data.json) is rebuilt from the
+# records instead of trusted.
+SEARCH_WORD = re.compile(r"\w+")
+
+def search_words(text):
+    return set(SEARCH_WORD.findall(str(text).lower()))
+
+class SearchIndex:
+    def __init__(self, postings=None):
+        self.postings = postings or {}  # word -> set of IDs
+        self.words = sorted(self.postings)
+
+    def add(self, t):
+        for word in search_words(t.get("description", "")):
+            ids = self.postings.get(word)
+            if ids is None:
+                ids = self.postings[word] = set()
+                insort(self.words, word)
+            ids.add(t["id"])
+
+    def remove(self, t):
+        for word in search_words(t.get("description", "")):
+            ids = self.postings.get(word)
+            if ids is None:
+                continue
+            ids.discard(t["id"])
+            if not ids:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+
+    def search(self, text):
+        # IDs whose description has, for every word of text, a word
+        # starting with it
+        found = None
+        # Longest (usually rarest) prefixes first, so later ones only
+        # intersect their words' IDs with a short list of candidates
+        for prefix in sorted(search_words(text), key=len, reverse=True):
+            ids = set()
+            for word in self.words[bisect_left(self.words, prefix):bisect_left(self.words, prefix + "\U0010ffff")]:
+                ids |= self.postings[word] if found is None else found & self.postings[word]
+            found = ids
+            if not found:
+                break
+        return found or set()
+
+def search_path(username):
+    return os.path.join(SEARCH_DIR, quote(username, safe="") + ".json")
+
+def data_stamp(data, username):
+    # Identifies the current contents of the user's data files
+    return file_stamps(data["_storage"].files(username))
+
+def read_stamped(data, username, path):
+    # A file saved with write_stamped(), or None when it is missing or the
+    # data files have changed since
+    try:
+        with open(path, "r") as file:
+            saved = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(saved, dict) or saved.get("stamp") != data_stamp(data, username):
+        return None
+    return saved
+
+def write_stamped(data, username, path, saved):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_json_atomic(path, dict(saved, stamp=data_stamp(data, username)), separators=(",", ":"))
+
+def search_index(data, username):
+    indexes = data.setdefault("_search", {})
+    if username not in indexes:
+        saved = read_stamped(data, username, search_path(username))
+        index = SearchIndex({word: set(ids) for word, ids in saved["postings"].items()}) if saved else None
+        if index is None:
+            index = SearchIndex()
+            for t in iter_transactions(data, username):
+                index.add(t)
+        # The stamp the file on disk matches, None when it needs saving
+        data.setdefault("_search_stamps", {})[username] = saved and saved["stamp"]
+        indexes[username] = index
+    return indexes[username]
+
+def update_search(data, entry, removed, added):
+    username = entry["user"]
+    index = data.get("_search", {}).get(username)
+    if index is None or (entry["op"] == "edit" and "description" not in entry["changes"]):
+        return
+    if entry["op"] == "clear":
+        data["_search"][username] = SearchIndex()
+    for t in removed:
+        index.remove(t)
+    for t in added:
+        index.add(t)
+
+def save_search_indexes(data):
+    # Saves every loaded index whose file no longer matches the data files,
+    # which includes any that changed since the change was flushed
+    stamps = data.get("_search_stamps", {})
+    for username, index in data.get("_search", {}).items():
+        if stamps[username] != data_stamp(data, username):
+            write_stamped(data, username, search_path(username), {"postings": {word: sorted(ids) for word, ids in index.postings.items()}})
+            stamps[username] = data_stamp(data, username)
+
+def search_transactions(data, username, text):
+    # Matching records in ID order
+    found = (get_transaction(data, username, tid) for tid in sorted(search_index(data, username).search(text)))
+    return [t for t in found if t is not None]
+
+# --- Monthly rollups ---
+# Totals of every closed month (any month before the current one) per type
+# and per (type, category), with record counts and the days that have
+# records, saved to ROLLUP_DIR/<user>.json like the search index. Month,
+# quarter and year reports add up these rows and only go to the records for
+# the open month and for months a date range cuts in half. A change dated
+# in a closed month marks that month stale, and it is rebuilt from the
+# records on the next report; when a new month starts, the one before is
+# rolled up the same way.
+def rollup_path(username):
+    return os.path.join(ROLLUP_DIR, quote(username, safe="") + ".json")
+
+def month_end(month):
+    # "2024-02" -> "2024-02-29"
+    y, m, _ = ymd_parts(month + "-01")
+    return f"{month}-{calendar.monthrange(y, m)[1]:02d}" if 1 <= m <= 12 else month + "-31"
+
+def next_month_start(month):
+    # "2024-02" -> "2024-03-01"
+    return (datetime.strptime(month_end(month), "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+def last_closed_month():
+    return (datetime.now().replace(day=1) - timedelta(days=1)).strftime("%Y-%m")
+
+def rollup_rows(transactions):
+    # Month -> {"count", "types": {type: [cents, count]},
+    #           "categories": {type: {category: [cents, count]}}, "days": [day, ...]}
+    months = {}
+    for t in transactions:
+        date = t["date"]
+        row = months.get(date[:7])
+        if row is None:
+            row = months[date[:7]] = {"count": 0, "types": {}, "categories": {}, "days": set()}
+        amount = amount_cents(t)
+        row["count"] += 1
+        add_to_bucket(row["types"], t["type"], amount, 1)
+        add_to_bucket(row["categories"].setdefault(t["type"], {}), t["category"], amount, 1)
+        row["days"].add(date[8:])
+    for row in months.values():
+        row["days"] = sorted(row["days"])
+    return months
+
+def get_rollups(data, username):
+    cache = data.setdefault("_rollups", {})
+    if username not in cache:
+        saved = read_stamped(data, username, rollup_path(username))
+        if saved:
+            cache[username] = {"through": saved["through"], "months": saved["months"], "stale": set()}
+        else:
+            # Everything before the open month in one pass
+            through = last_closed_month()
+            months = rollup_rows(iter_transactions(data, username, end=month_end(through)))
+            cache[username] = {"through": through, "months": months, "stale": set()}
+            data.setdefault("_rollups_unsaved", set()).add(username)
+    rollups = cache[username]
+    through = last_closed_month()
+    if through > rollups["through"]:
+        # Months closed since the rollups were last brought up to date
+        start = next_month_start(rollups["through"])
+        rollups["months"].update(rollup_rows(iter_transactions(data, username, start=start, end=month_end(through))))
+        rollups["through"] = through
+        data.setdefault("_rollups_unsaved", set()).add(username)
+    if rollups["stale"]:
+        for month in rollups["stale"]:
+            rollups["months"].pop(month, None)
+            rollups["months"].update(rollup_rows(iter_transactions(data, username, start=month + "-01", end=month_end(month))))
+        rollups["stale"] = set()
+        data.setdefault("_rollups_unsaved", set()).add(username)
+    return rollups
+
+def update_rollups(data, entry, removed, added):
+    # The closed months a change touches are rebuilt once it is stored
+    username = entry["user"]
+    rollups = data.get("_rollups", {}).get(username)
+    if rollups is None:
+        return
+    if entry["op"] == "clear":
+        rollups["months"] = {}
+        rollups["stale"] = set()
+        data.setdefault("_rollups_unsaved", set()).add(username)
+        return
+    rollups["stale"].update(t["date"][:7] for t in removed + added if t["date"][:7] <= rollups["through"])
+
+def rollup_totals(data, username, kind, start=None, end=None):
+    # group_totals() for months, quarters and years: whole closed months in
+    # the range come from the rollups and the remaining days from storage
+    rollups = get_rollups(data, username)
+    through = rollups["through"]
+    groups = {}
+    def add(key, type_, cents):
+        sums = groups.setdefault(key, {"Income": 0, "Expense": 0})
+        if type_ in sums:
+            sums[type_] += cents
+    for month, row in rollups["months"].items():
+        if (start and month + "-01" < start) or (end and month_end(month) > end):
+            continue
+        key = bucket_of(data, kind, month + "-01")
+        for type_, (cents, _) in row["types"].items():
+            add(key, type_, cents)
+    ranges = []
+    if start and start[:7] <= through and start[8:] != "01":
+        # The part of the first month that is in range (all of it when the
+        # range ends in the same month)
+        ranges.append((start, min(end, month_end(start[:7])) if end else month_end(start[:7])))
+    if end and end[:7] <= through and end != month_end(end[:7]) and not (ranges and start[:7] == end[:7]):
+        # ... and of the last one
+        ranges.append((end[:7] + "-01", end))
+    open_start = next_month_start(through)
+    if not end or end >= open_start:
+        ranges.append((max(start, open_start) if start else open_start, end))
+    storage = data["_storage"]
+    for first, last in ranges:
+        for date, sums in storage.totals(data, username, "date", start=first, end=last).items():
+            key = bucket_of(data, kind, date)
+            if key is not None:
+                for type_, total in sums.items():
+                    add(key, type_, to_cents(total))
+    for sums in groups.values():
+        for type_ in sums:
+            sums[type_] /= 100
+    return groups
+
+def save_rollups(data):
+    for username in data.pop("_rollups_unsaved", set()):
+        rollups = get_rollups(data, username)
+        write_stamped(data, username, rollup_path(username), {"through": rollups["through"], "months": rollups["months"]})
+
+# --- Aggregate cache ---
+# Running totals per type, per (type, category) and per day for each user,
+# built once from storage and then adjusted by commit_change() on every add,
+# edit and delete. Each bucket is [total in cents, count] and is dropped when
+# its count reaches zero.
+def new_aggregates():
+    return {"types": {}, "categories": {}, "days": {}}
+
+def add_to_bucket(buckets, key, amount, sign):
+    bucket = buckets.setdefault(key, [0, 0])
+    bucket[0] += sign * amount
+    bucket[1] += sign
+    if bucket[1] == 0:
+        del buckets[key]
+
+def bucket_totals(buckets):
+    return {type_: buckets[type_][0] / 100 if type_ in buckets else 0 for type_ in ("Income", "Expense")}
+
+def count_transaction(aggregates, t, sign):
+    amount = amount_cents(t)
+    add_to_bucket(aggregates["types"], t["type"], amount, sign)
+    add_to_bucket(aggregates["categories"], (t["type"], t["category"]), amount, sign)
+    day = aggregates["days"].setdefault(t["date"], {"count": 0, "types": {}, "categories": {}})
+    day["count"] += sign
+    if day["count"] == 0:
+        del aggregates["days"][t["date"]]
+        return
+    add_to_bucket(day["types"], t["type"], amount, sign)
+    add_to_bucket(day["categories"], (t["type"], t["category"]), amount, sign)
+
+def count_group(aggregates, date, type_, category, total, count):
+    # Adds count records of one (day, type, category) totalling total cents
+    day = aggregates["days"].setdefault(date, {"count": 0, "types": {}, "categories": {}})
+    day["count"] += count
+    for buckets, key in ((aggregates["types"], type_), (aggregates["categories"], (type_, category)),
+                         (day["types"], type_), (day["categories"], (type_, category))):
+        bucket = buckets.setdefault(key, [0, 0])
+        bucket[0] += total
+        bucket[1] += count
+
+def get_aggregates(data, username):
+    cache = data.setdefault("_aggregates", {})
+    if username not in cache:
+        storage = data["_storage"]
+        transactions = storage.transactions(data, username) if isinstance(storage, MemoryStorage) else None
+        if isinstance(storage, SqliteStorage):
+            aggregates = storage.aggregates(data, username)
+        elif np is not None and isinstance(transactions, ColumnarTransactions):
+            aggregates = numpy_aggregates(transactions)
+        else:
+            aggregates = new_aggregates()
+            for t in iter_transactions(data, username):
+                count_transaction(aggregates, t, 1)
+        cache[username] = aggregates
+    return cache[username]
+
+def update_aggregates(aggregates, entry, removed, added):
+    if entry["op"] == "clear":
+        aggregates.update(new_aggregates())
+    for t in removed:
+        count_transaction(aggregates, t, -1)
+    for t in added:
+        count_transaction(aggregates, t, 1)
+
+# --- Grouping ---
+# History groupings (day, ISO week, month, quarter, year and custom N-day
+# windows) share one engine. A grouping is a function from a date string to
+# its bucket key, memoized per date since dates repeat, and bucket totals are
+# folded from the per-day aggregate cache instead of re-adding transactions
+# (months, quarters and years from the monthly rollups). Totals are cached
+# per user until the next change.
+def ymd_parts(date):
+    # Returns (year, month, day)
+    try:
+        dt = datetime.strptime(date, "%Y-%m-%d")
+        return dt.year, dt.month, dt.day
     except Exception:
-        pass
+        # Fallback if date is malformed
+        parts = date.split("-")
+        y = int(parts[0]) if len(parts) > 0 and parts[0].isdigit() else 0
+        m = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+        d = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
+        return y, m, d
 
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        return {"users": {}, "transactions": {}}
-    with open(DATA_FILE, "r") as file:
-        data = json.load(file)
-    if "users" not in data:
-        data["users"] = {}
-    if "transactions" not in data:
-        data["transactions"] = {}
+def day_key(date):
+    return date
+
+def week_key(date):
+    try:
+        y, w, _ = datetime.strptime(date, "%Y-%m-%d").isocalendar()
+    except (ValueError, TypeError):
+        return None  # Skip malformed dates
+    return f"{y:04d}-W{w:02d}"
+
+def month_key(date):
+    y, m, _ = ymd_parts(date)
+    return f"{y:04d}-{m:02d}"
+
+def quarter_key(date):
+    y, m, _ = ymd_parts(date)
+    return f"{y:04d}-Q{(m - 1) // 3 + 1}" if m else f"{y:04d}-Q0"
+
+def year_key(date):
+    return ymd_parts(date)[0]
+
+def window_key(size, last):
+    # Consecutive size-day windows, the newest one ending on the date last
+    last = date_ordinal(last)
+    def key(date):
+        ordinal = date_ordinal(date)
+        if not ordinal:
+            return None
+        end = last - (last - ordinal) // size * size
+        first = datetime.fromordinal(end - size + 1).strftime("%Y-%m-%d")
+        return f"{first} to {datetime.fromordinal(end).strftime('%Y-%m-%d')}"
+    return key
+
+# Grouping name -> (bucket key function, days per unit for "last N" ranges)
+GROUPINGS = {
+    "day": (day_key, 1),
+    "week": (week_key, 7),
+    "month": (month_key, 30),  # Approximate months
+    "quarter": (quarter_key, 91),
+    "year": (year_key, 365),  # Approximate years
+}
+
+def period_range(kind, key):
+    # First and last day of a month, quarter or year bucket
+    if kind == "year":
+        return f"{key:04d}-01-01", f"{key:04d}-12-31"
+    if kind == "quarter":
+        year, quarter = key.split("-Q")
+        return f"{year}-{max(int(quarter) * 3 - 2, 1):02d}-01", month_end(f"{year}-{max(int(quarter) * 3, 1):02d}")
+    return key + "-01", month_end(key)
+
+def bucket_of(data, kind, date):
+    # kind is a GROUPINGS name or ("window", size, last date)
+    keys = data.setdefault("_bucket_keys", {}).setdefault(kind, {})
+    if date not in keys:
+        key_function = window_key(kind[1], kind[2]) if isinstance(kind, tuple) else GROUPINGS[kind][0]
+        keys[date] = key_function(date)
+    return keys[date]
+
+def group_transactions(data, kind, transactions):
+    groups = {}
+    for t in transactions:
+        key = bucket_of(data, kind, t["date"])
+        if key is not None:
+            groups.setdefault(key, []).append(t)
+    return groups
+
+def group_totals(data, username, kind, start=None, end=None):
+    cache = data.setdefault("_groups", {}).setdefault(username, {})
+    if (kind, start, end) not in cache and kind in ("month", "quarter", "year"):
+        cache[(kind, start, end)] = rollup_totals(data, username, kind, start, end)
+    if (kind, start, end) not in cache:
+        groups = {}
+        for date, day in get_aggregates(data, username)["days"].items():
+            if (start and date < start) or (end and date > end):
+                continue
+            key = bucket_of(data, kind, date)
+            if key is None:
+                continue
+            sums = groups.setdefault(key, {"Income": 0, "Expense": 0})
+            for type_ in sums:
+                if type_ in day["types"]:
+                    sums[type_] += day["types"][type_][0]
+        for sums in groups.values():
+            for type_ in sums:
+                sums[type_] /= 100
+        cache[(kind, start, end)] = groups
+    return cache[(kind, start, end)]
+
+# Amounts are added up as integer cents so totals are exact
+def to_cents(amount):
+    return round(amount * 100)
+
+def amount_cents(t):
+    if type(t) is RecordView:
+        return t.cents
+    return to_cents(t["amount"])
+
+def aggregate(transactions, bucket=None):
+    # Walks the transactions once and returns everything the summaries need:
+    # totals per type, per (type, category) and per bucket key (the date,
+    # unless another key function is given), plus the count and the
+    # smallest/largest amount.
+    if np is not None and bucket is None:
+        columns = columnar_rows(transactions)
+        if columns is not None:
+            return numpy_aggregate(*columns)
+    types = {"Income": 0, "Expense": 0}
+    categories = {}
+    buckets = {}
+    count = 0
+    smallest = largest = None
+    for t in transactions:
+        amount = amount_cents(t)
+        type_ = t["type"]
+        types[type_] += amount
+        key = (type_, t["category"])
+        categories[key] = categories.get(key, 0) + amount
+        key = bucket(t) if bucket else t["date"]
+        sums = buckets.get(key)
+        if sums is None:
+            sums = buckets[key] = {"Income": 0, "Expense": 0}
+        sums[type_] += amount
+        count += 1
+        if smallest is None or amount < smallest:
+            smallest = amount
+        if largest is None or amount > largest:
+            largest = amount
+    for sums in [types, categories, *buckets.values()]:
+        for key in sums:
+            sums[key] /= 100
+    return {"types": types, "categories": categories, "buckets": buckets, "count": count,
+            "min": smallest / 100 if count else None, "max": largest / 100 if count else None}
+
+def matches_filters(t, type_=None, category=None, date=None, start=None, end=None):
+    if type_ is not None and t["type"] != type_:
+        return False
+    if category is not None and t["category"] != category:
+        return False
+    if date is not None and t["date"] != date:
+        return False
+    if start is not None and t["date"] < start:
+        return False
+    if end is not None and t["date"] > end:
+        return False
+    return True
+
+# --- JSON storage ---
+# Each change is one compact JSON line in JOURNAL_FILE. load() replays the
+# lines on top of the data.json snapshot, and every JOURNAL_COMPACT_AT
+# entries the snapshot is rewritten and the journal is cleared.
+#
+# The snapshot is not parsed in one go. load() walks the memory-mapped file
+# and only decodes the top-level keys other than "transactions"; for each
+# user's transaction array it just notes where it starts and ends. A user's
+# array is decoded record by record the first time it is needed, and arrays
+# that were never loaded are copied over as raw bytes when the snapshot is
+# rewritten. Snapshots written this way start with an "index" member giving
+# the file size and every array's offsets and keep "transactions" last, so
+# reading one needs no scan at all; other files are scanned once and then
+# rewritten in that layout.
+def apply_change(data, entry):
+    op = entry["op"]
+    username = entry["user"]
+    if op == "user":
+        data["users"][username] = {"email": entry["email"], "password": entry["password"]}
+        data["transactions"].setdefault(username, make_transactions([]))
+        return
+    transactions = data["transactions"].setdefault(username, make_transactions([]))
+    if op in ("add", "import"):
+        for t in entry["records"] if op == "import" else [entry["record"]]:
+            transactions.append(dict(t))
+            bump_next_id(data, username, t["id"])
+    elif op == "edit":
+        transaction = next((t for t in transactions if t["id"] == entry["id"]), None)
+        if transaction:
+            transaction.update(entry["changes"])
+    elif op == "delete":
+        ids = set(entry["ids"])
+        transactions[:] = [t for t in transactions if t["id"] not in ids]
+    elif op == "clear":
+        transactions.clear()
+
+def replay_journal(data, apply):
+    data["_journal_entries"] = 0
+    if not os.path.exists(JOURNAL_FILE):
+        return
+    with open(JOURNAL_FILE, "r") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Left by an interrupted write. flush() starts the next entry
+                # on a new line, so the entries after it still replay.
+                continue
+            # Entries already folded into the snapshot are skipped
+            if entry["seq"] <= data["journal_seq"]:
+                continue
+            apply(data, entry)
+            data["journal_seq"] = entry["seq"]
+            data["_journal_entries"] += 1
+
+def journal_ends_line():
+    with open(JOURNAL_FILE, "rb") as file:
+        file.seek(-1, os.SEEK_END)
+        return file.read(1) == b"\n"
+
+JSON_SPACE = re.compile(rb"[\s,:]*")  # Separators are skipped along with whitespace
+JSON_STRING_REST = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+JSON_SCALAR = re.compile(rb"[^\s,\]}]*")
+# Text up to the next bracket, with strings (which may hold brackets) skipped whole
+JSON_RUN = rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*'
+JSON_FLAT = re.compile(JSON_RUN, re.S)
+# Consecutive objects with nothing nested, i.e. typical transaction records
+JSON_FLAT_OBJECTS = re.compile(rb"(?:[\s,]*\{" + JSON_RUN + rb"\})*", re.S)
+
+def json_value_end(buf, pos):
+    # Offset just past the JSON value starting at pos, found without decoding it
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        return JSON_STRING_REST.match(buf, pos + 1).end()
+    if first not in (b"{", b"["):
+        return JSON_SCALAR.match(buf, pos).end()
+    depth = 0
+    while True:
+        token = buf[pos:pos + 1]
+        if not token:
+            raise ValueError("unterminated JSON value")
+        depth += 1 if token in (b"{", b"[") else -1
+        pos += 1
+        if depth == 0:
+            return pos
+        pos = JSON_FLAT_OBJECTS.match(buf, pos).end()
+        pos = JSON_FLAT.match(buf, pos).end()
+
+def json_items(buf, pos):
+    # (start, end) of each element of the array starting at pos
+    pos = JSON_SPACE.match(buf, pos + 1).end()
+    while buf[pos:pos + 1] != b"]":
+        end = json_value_end(buf, pos)
+        yield pos, end
+        pos = JSON_SPACE.match(buf, end).end()
+
+def json_members(buf, pos):
+    # (key, start, end) of each member of the object starting at pos
+    pos = JSON_SPACE.match(buf, pos + 1).end()
+    while buf[pos:pos + 1] != b"}":
+        end = json_value_end(buf, pos)
+        key = json.loads(buf[pos:end])
+        start = JSON_SPACE.match(buf, end).end()
+        end = json_value_end(buf, start)
+        yield key, start, end
+        pos = JSON_SPACE.match(buf, end).end()
+
+def open_snapshot():
+    # Read-only mapping of a non-empty DATA_FILE; the caller closes both
+    file = open(DATA_FILE, "rb")
+    return file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def read_snapshot():
+    # Everything except the transaction arrays, plus where each array sits
+    # in the file (data["_snapshot_spans"])
+    data = {"users": {}, "transactions": {}, "journal_seq": 0, "_snapshot_spans": {}}
+    if not os.path.exists(DATA_FILE) or not os.path.getsize(DATA_FILE):
+        return data
+    index = None
+    file, buf = open_snapshot()
+    with file, buf:
+        # Like json_members(), but without finding the end of "transactions"
+        # up front
+        pos = JSON_SPACE.match(buf, JSON_SPACE.match(buf).end() + 1).end()
+        while buf[pos:pos + 1] != b"}":
+            end = json_value_end(buf, pos)
+            key = json.loads(buf[pos:end])
+            start = JSON_SPACE.match(buf, end).end()
+            if key == "transactions":
+                if snapshot_index_matches(buf, index):
+                    data["_snapshot_spans"] = {username: tuple(span) for username, span in index["spans"].items()}
+                    break  # Written last, nothing follows
+                end = start
+                for username, first, end in json_members(buf, start):
+                    data["_snapshot_spans"][username] = (first, end)
+                end = buf.find(b"}", end) + 1
+                data["_snapshot_scanned"] = True
+            else:
+                end = json_value_end(buf, start)
+                if key == "index":
+                    index = json.loads(buf[start:end])
+                else:
+                    data[key] = json.loads(buf[start:end])
+            pos = JSON_SPACE.match(buf, end).end()
     return data
 
-def save_data(data):
-    with open(DATA_FILE, "w") as file:
-        json.dump(data, file, indent=4)
+def snapshot_index_matches(buf, index):
+    # A file edited by hand since it was written falls back to a scan
+    if not index or index.get("size") != len(buf):
+        return False
+    return all(buf[first:first + 1] == b"[" and buf[last - 1:last] == b"]" for first, last in index["spans"].values())
+
+def snapshot_index(size, spans):
+    # Fixed-width numbers, so the placeholder written first can be
+    # overwritten in place once the offsets are known
+    entries = ", ".join(f"{json.dumps(username)}: [{first:>20}, {last:>20}]" for username, (first, last) in spans.items())
+    return f'    "index": {{"size": {size:>20}, "spans": {{{entries}}}}},\n'.encode()
+
+def read_snapshot_records(span):
+    file, buf = open_snapshot()
+    with file, buf:
+        return make_transactions(json.loads(buf[start:end]) for start, end in json_items(buf, span[0]))
+
+# --- Columnar transactions ---
+# With COLUMNAR = True the in-memory backends keep each user's transactions
+# in typed arrays instead of a list of dicts: IDs, date ordinals, cents and
+# timestamps as machine ints, type and category as small codes into a shared
+# name table, and descriptions as codes into a string pool. Screens read the
+# rows through RecordView, which behaves like the old dict. Values that would
+# not come back exactly (malformed dates, sub-cent amounts, extra keys) are
+# kept as-is in a per-row side table. Views are made on demand and not kept,
+# so a store that has been iterated is no bigger than one that has not.
+TRANSACTION_KEYS = ("id", "date", "type", "amount", "category", "description", "timestamp")
+EPOCH = datetime(1970, 1, 1)
+
+def make_transactions(records):
+    return ColumnarTransactions(records) if COLUMNAR else list(records)
+
+def plain_records(transactions):
+    if isinstance(transactions, ColumnarTransactions):
+        return [dict(t) for t in transactions]
+    return transactions
+
+class RecordView:
+    __slots__ = ("owner", "slot")
+
+    def __init__(self, owner, slot):
+        self.owner = owner
+        self.slot = slot
+
+    @property
+    def cents(self):
+        return self.owner.cents[self.slot]
+
+    def __getitem__(self, key):
+        return self.owner.read(self.slot, key)
+
+    def __setitem__(self, key, value):
+        self.owner.write(self.slot, key, value)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.owner.keys(self.slot)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def update(self, changes):
+        for key, value in changes.items():
+            self[key] = value
+
+class ColumnarTransactions:
+    def __init__(self, records=()):
+        self.clear()
+        for t in records:
+            self.append(t)
+
+    def clear(self):
+        self.ids = array("q")
+        self.days = array("i")
+        self.types = array("h")
+        self.categories = array("h")
+        self.cents = array("q")
+        self.descriptions = array("i")
+        self.stamps = array("q")
+        self.names = []  # Interned type and category names
+        self.name_codes = {}
+        self.pool = []  # Interned descriptions
+        self.pool_codes = {}
+        self.extras = {}  # slot -> values kept as-is
+        self.order = array("i")  # Live slots in list order
+        self.mapping = None  # Binary file the columns are read from, if any
+
+    def thaw(self):
+        # Columns mapped from a binary file are copied into ordinary arrays
+        # before they have to grow (or the file is replaced)
+        if self.mapping is None:
+            return
+        for name, code in BINARY_COLUMNS:
+            column = array(code)
+            column.frombytes(getattr(self, name).cast("B"))
+            setattr(self, name, column)
+        self.mapping = None
+
+    def intern(self, table, codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(table)
+            table.append(value)
+        return code
+
+    def keep_extra(self, slot, key, value):
+        self.extras.setdefault(slot, {})[key] = value
+
+    def write(self, slot, key, value):
+        extra = self.extras.get(slot)
+        if extra:
+            extra.pop(key, None)
+        if key == "id" and type(value) is int:
+            self.ids[slot] = value
+        elif key == "date" and isinstance(value, str):
+            ordinal = date_ordinal(value)
+            self.days[slot] = ordinal
+            if not ordinal or datetime.fromordinal(ordinal).strftime("%Y-%m-%d") != value:
+                self.keep_extra(slot, key, value)
+        elif key == "type" and isinstance(value, str):
+            self.types[slot] = self.intern(self.names, self.name_codes, value)
+        elif key == "category" and isinstance(value, str):
+            self.categories[slot] = self.intern(self.names, self.name_codes, value)
+        elif key == "amount" and isinstance(value, (int, float)):
+            self.cents[slot] = to_cents(value)
+            if self.cents[slot] / 100 != value:
+                self.keep_extra(slot, key, value)
+        elif key == "description" and isinstance(value, str):
+            self.descriptions[slot] = self.intern(self.pool, self.pool_codes, value)
+        elif key == "timestamp" and isinstance(value, str):
+            try:
+                stamp = datetime.fromisoformat(value)
+                self.stamps[slot] = (stamp - EPOCH) // timedelta(microseconds=1)
+                if stamp.isoformat() != value:
+                    self.keep_extra(slot, key, value)
+            except (ValueError, TypeError):
+                self.keep_extra(slot, key, value)
+        else:
+            self.keep_extra(slot, key, value)
+
+    def read(self, slot, key):
+        extra = self.extras.get(slot)
+        if extra and key in extra:
+            return extra[key]
+        if key == "id":
+            return self.ids[slot]
+        if key == "date":
+            return datetime.fromordinal(self.days[slot]).strftime("%Y-%m-%d")
+        if key == "type":
+            return self.names[self.types[slot]]
+        if key == "category":
+            return self.names[self.categories[slot]]
+        if key == "amount":
+            return self.cents[slot] / 100
+        if key == "description":
+            return self.pool[self.descriptions[slot]]
+        if key == "timestamp":
+            return (EPOCH + timedelta(microseconds=self.stamps[slot])).isoformat()
+        raise KeyError(key)
+
+    def keys(self, slot):
+        extra = self.extras.get(slot, {})
+        return list(TRANSACTION_KEYS) + [key for key in extra if key not in TRANSACTION_KEYS]
+
+    def append(self, t):
+        self.thaw()
+        slot = len(self.ids)
+        for column in (self.ids, self.days, self.types, self.categories, self.cents, self.descriptions, self.stamps):
+            column.append(0)
+        for key, value in t.items():
+            self.write(slot, key, value)
+        self.order.append(slot)
+
+    def view(self, slot):
+        return RecordView(self, slot)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        for slot in self.order:
+            yield self.view(slot)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.view(slot) for slot in self.order[i]]
+        return self.view(self.order[i])
+
+    def __delitem__(self, i):
+        slot = self.order[i]
+        del self.order[i]
+        self.extras.pop(slot, None)
+
+    def __setitem__(self, i, records):
+        # Only whole-list replacement (transactions[:] = ...) is supported
+        if i != slice(None):
+            raise TypeError("only transactions[:] can be assigned")
+        records = [dict(t) for t in records]
+        self.clear()
+        for t in records:
+            self.append(t)
+
+# --- NumPy analytics ---
+# When NumPy is installed, totals over a columnar store are computed with
+# vectorized reductions over its arrays instead of a Python loop per record.
+# Rows whose date, type or category had to be kept verbatim are left to the
+# Python path. np.frombuffer views of the arrays are only held while
+# indexing, since an array cannot grow while a view of it is alive.
+def columnar_rows(transactions):
+    # (store, slots) when transactions is a columnar store or a big enough
+    # list of rows from one store with nothing kept verbatim, else None
+    if isinstance(transactions, ColumnarTransactions):
+        owner = transactions
+        slots = np.array(owner.order, dtype=np.int64)
+    elif isinstance(transactions, list) and len(transactions) >= NUMPY_MIN_ROWS and type(transactions[0]) is RecordView:
+        owner = transactions[0].owner
+        slots = np.fromiter((t.slot for t in transactions if type(t) is RecordView and t.owner is owner), dtype=np.int64)
+        if len(slots) != len(transactions):
+            return None
+    else:
+        return None
+    if len(slots) < NUMPY_MIN_ROWS or columnar_oddities(owner, slots).size:
+        return None
+    return owner, slots
+
+def columnar_oddities(owner, slots):
+    odd = [slot for slot, extra in owner.extras.items() if "date" in extra or "type" in extra or "category" in extra]
+    return slots[np.isin(slots, odd)] if odd else slots[:0]
+
+def columnar_columns(owner, slots):
+    days = np.frombuffer(owner.days, dtype=np.int32)[slots].astype(np.int64)
+    types = np.frombuffer(owner.types, dtype=np.int16)[slots].astype(np.int64)
+    categories = np.frombuffer(owner.categories, dtype=np.int16)[slots].astype(np.int64)
+    cents = np.frombuffer(owner.cents, dtype=np.int64)[slots]
+    return days, types, categories, cents
+
+def grouped_sums(keys, cents):
+    # Distinct keys with their cent totals and row counts, in order of first
+    # appearance like the dicts the Python loops build
+    unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    sums = np.rint(np.bincount(inverse, weights=cents, minlength=len(unique))).astype(np.int64)
+    counts = np.bincount(inverse, minlength=len(unique))
+    order = np.argsort(first, kind="stable")
+    return unique[order].tolist(), sums[order].tolist(), counts[order].tolist()
+
+def ordinal_date(ordinal):
+    return datetime.fromordinal(ordinal).strftime("%Y-%m-%d")
+
+def numpy_aggregate(owner, slots):
+    # Same result as the Python loop in aggregate() with date buckets
+    days, types, categories, cents = columnar_columns(owner, slots)
+    names = owner.names
+    width = max(len(names), 1)
+    result = {"types": {"Income": 0, "Expense": 0}, "categories": {}, "buckets": {},
+              "count": len(slots), "min": int(cents.min()) / 100, "max": int(cents.max()) / 100}
+    for code, total, _ in zip(*grouped_sums(types, cents)):
+        result["types"][names[code]] = total / 100
+    for key, total, _ in zip(*grouped_sums(types * width + categories, cents)):
+        result["categories"][(names[key // width], names[key % width])] = total / 100
+    for key, total, _ in zip(*grouped_sums(days * width + types, cents)):
+        sums = result["buckets"].setdefault(ordinal_date(key // width), {"Income": 0, "Expense": 0})
+        sums[names[key % width]] = total / 100
+    return result
+
+def numpy_aggregates(transactions):
+    # Builds the dashboard's aggregate cache (see new_aggregates) in one
+    # vectorized pass over the (day, type, category) combinations
+    aggregates = new_aggregates()
+    slots = np.array(transactions.order, dtype=np.int64)
+    odd = columnar_oddities(transactions, slots)
+    if odd.size:
+        slots = slots[~np.isin(slots, odd)]
+    if len(slots):
+        days, types, categories, cents = columnar_columns(transactions, slots)
+        names = transactions.names
+        width = max(len(names), 1)
+        for key, total, count in zip(*grouped_sums((days * width + types) * width + categories, cents)):
+            rest, category = divmod(key, width)
+            ordinal, type_ = divmod(rest, width)
+            count_group(aggregates, ordinal_date(ordinal), names[type_], names[category], total, count)
+    for slot in odd.tolist():
+        count_transaction(aggregates, transactions.view(slot), 1)
+    return aggregates
+
+# --- Date index ---
+# Keeps one user's transactions ordered by date (as ordinal ints) so day,
+# week, month and year windows and exact-date lookups are bisect slices
+# instead of full scans. Records with the same date stay in the order they
+# were added.
+def date_ordinal(date):
+    try:
+        return datetime.fromisoformat(date).toordinal()
+    except ValueError:
+        return 0  # Malformed dates sort before everything else
+
+class DateIndex:
+    def __init__(self, transactions):
+        pairs = sorted(((date_ordinal(t["date"]), t) for t in transactions), key=lambda pair: pair[0])
+        self.ordinals = [ordinal for ordinal, _ in pairs]
+        self.records = [t for _, t in pairs]
+
+    def add(self, t):
+        i = bisect_right(self.ordinals, date_ordinal(t["date"]))
+        self.ordinals.insert(i, date_ordinal(t["date"]))
+        self.records.insert(i, t)
+
+    def remove(self, t):
+        ordinal = date_ordinal(t["date"])
+        for i in range(bisect_left(self.ordinals, ordinal), bisect_right(self.ordinals, ordinal)):
+            if self.records[i] is t:
+                del self.ordinals[i]
+                del self.records[i]
+                return
+
+    def between(self, start=None, end=None):
+        lo = bisect_left(self.ordinals, date_ordinal(start)) if start else 0
+        hi = bisect_right(self.ordinals, date_ordinal(end)) if end else len(self.ordinals)
+        return self.records[lo:hi]
+
+class ColumnarDateIndex(DateIndex):
+    # The same index over a columnar store, built from its day column and
+    # holding slot numbers in typed arrays instead of a view per record
+    def __init__(self, transactions):
+        self.owner = transactions
+        days = transactions.days
+        self.records = array("i", sorted(transactions.order, key=days.__getitem__))
+        self.ordinals = array("i", (days[slot] for slot in self.records))
+
+    def add(self, t):
+        ordinal = self.owner.days[t.slot]
+        i = bisect_right(self.ordinals, ordinal)
+        self.ordinals.insert(i, ordinal)
+        self.records.insert(i, t.slot)
+
+    def remove(self, t):
+        ordinal = self.owner.days[t.slot]
+        for i in range(bisect_left(self.ordinals, ordinal), bisect_right(self.ordinals, ordinal)):
+            if self.records[i] == t.slot:
+                del self.ordinals[i]
+                del self.records[i]
+                return
+
+    def between(self, start=None, end=None):
+        return [self.owner.view(slot) for slot in super().between(start, end)]
+
+# --- ID index ---
+# Maps transaction IDs to their records for O(1) lookup, edit and delete.
+# While the list is in ascending ID order (always true for IDs from the
+# counter) a record's position is found by bisecting on the ID, so deleting
+# one record does not rebuild the whole list.
+class IdIndex:
+    def __init__(self, transactions):
+        self.records = {}
+        for t in transactions:
+            self.records.setdefault(t["id"], t)
+        self.ordered = len(self.records) == len(transactions) and all(
+            a["id"] < b["id"] for a, b in zip(transactions, transactions[1:]))
+
+    def get(self, tid):
+        return self.records.get(tid)
+
+    def pop(self, tid):
+        return self.records.pop(tid, None)
+
+    def add(self, t, transactions):
+        if t["id"] in self.records or (len(transactions) > 1 and transactions[-2]["id"] >= t["id"]):
+            self.ordered = False
+        self.records.setdefault(t["id"], t)
+
+    def position(self, transactions, t):
+        return bisect_left(transactions, t["id"], key=lambda x: x["id"])
+
+class ColumnarIdIndex(IdIndex):
+    # The same index over a columnar store. While the IDs ascend a record is
+    # found by bisecting the ID column in list order, so nothing is kept per
+    # record; otherwise IDs are mapped to slot numbers.
+    def __init__(self, transactions):
+        self.owner = transactions
+        ids = transactions.ids
+        order = transactions.order
+        self.slots = None
+        self.ordered = all(ids[a] < ids[b] for a, b in zip(order, islice(order, 1, None)))
+        if not self.ordered:
+            self.map_slots()
+
+    def map_slots(self):
+        self.slots = {}
+        for slot in self.owner.order:
+            self.slots.setdefault(self.owner.ids[slot], slot)
+
+    def find(self, tid):
+        if self.slots is not None:
+            return self.slots.get(tid)
+        order = self.owner.order
+        i = bisect_left(order, tid, key=self.owner.ids.__getitem__)
+        return order[i] if i < len(order) and self.owner.ids[order[i]] == tid else None
+
+    def get(self, tid):
+        slot = self.find(tid)
+        return None if slot is None else self.owner.view(slot)
+
+    def pop(self, tid):
+        t = self.get(tid)
+        if self.slots is not None:
+            self.slots.pop(tid, None)
+        return t
+
+    def add(self, t, transactions):
+        order = self.owner.order
+        if self.slots is None and len(order) > 1 and self.owner.ids[order[-2]] >= t["id"]:
+            self.ordered = False
+            self.map_slots()
+        elif self.slots is not None:
+            self.slots.setdefault(t["id"], t.slot)
+
+    def position(self, transactions, t):
+        return bisect_left(self.owner.order, t["id"], key=self.owner.ids.__getitem__)
+
+class MemoryStorage:
+    # Shared by the backends that keep a user's transactions as a list in
+    # data["transactions"]; subclasses decide how that list gets loaded.
+    def transactions(self, data, username):
+        return data["transactions"].get(username, [])
+
+    def date_index(self, data, username):
+        indexes = data.setdefault("_date_index", {})
+        if username not in indexes:
+            transactions = self.transactions(data, username)
+            indexes[username] = (ColumnarDateIndex if isinstance(transactions, ColumnarTransactions) else DateIndex)(transactions)
+        return indexes[username]
+
+    def id_index(self, data, username):
+        indexes = data.setdefault("_id_index", {})
+        if username not in indexes:
+            transactions = self.transactions(data, username)
+            indexes[username] = (ColumnarIdIndex if isinstance(transactions, ColumnarTransactions) else IdIndex)(transactions)
+        return indexes[username]
+
+    def apply(self, data, entry):
+        # apply_change() done through the ID index, keeping the date index
+        # (when built) in step
+        username = entry["user"]
+        op = entry["op"]
+        if op == "user":
+            apply_change(data, entry)
+            return
+        ids = self.id_index(data, username)
+        dates = data.get("_date_index", {}).get(username)
+        if op in ("add", "import"):
+            for t in entry["records"] if op == "import" else [entry["record"]]:
+                apply_change(data, {"op": "add", "user": username, "record": t})
+                transactions = data["transactions"][username]
+                ids.add(transactions[-1], transactions)
+                if dates:
+                    dates.add(transactions[-1])
+        elif op == "edit":
+            t = ids.get(entry["id"])
+            if t is None:
+                return
+            moved = dates is not None and "date" in entry["changes"]
+            if moved:
+                dates.remove(t)
+            t.update(entry["changes"])
+            if moved:
+                dates.add(t)
+        elif op == "delete" and ids.ordered:
+            transactions = self.transactions(data, username)
+            for tid in entry["ids"]:
+                t = ids.pop(tid)
+                if t is None:
+                    continue
+                del transactions[ids.position(transactions, t)]
+                if dates:
+                    dates.remove(t)
+        else:
+            # Clear, or a delete in legacy data with repeated IDs: rebuild the indexes
+            apply_change(data, entry)
+            data["_id_index"].pop(username, None)
+            data.get("_date_index", {}).pop(username, None)
+            data.get("_queries", {}).pop(username, None)
+
+    def candidates(self, data, username, date=None, start=None, end=None, order=None):
+        # Narrow by date through the index; without a date filter or an
+        # order the plain list keeps the original insertion order
+        if date is not None:
+            return self.date_index(data, username).between(date, date)
+        if start is not None or end is not None or order:
+            return self.date_index(data, username).between(start, end)
+        return self.transactions(data, username)
+
+    def find(self, data, username, order=None, type_=None, category=None, date=None, start=None, end=None):
+        found = [t for t in self.candidates(data, username, date, start, end, order) if matches_filters(t, type_, category)]
+        if order == "d":
+            found.sort(key=lambda t: t["date"], reverse=True)
+        return found
+
+    def query(self, data, username, plan):
+        # Start from the ID or date index when the filter pins IDs or dates
+        # down, then one pass of the compiled predicate
+        if plan["ids"] is not None and self.id_index(data, username).ordered:
+            ids = self.id_index(data, username)
+            candidates = [t for t in map(ids.get, plan["ids"]) if t is not None]
+        elif plan["start"] or plan["end"]:
+            candidates = self.date_index(data, username).between(plan["start"], plan["end"])
+        else:
+            candidates = self.transactions(data, username)
+        predicate = plan["predicate"]
+        return [t for t in candidates if predicate(t)]
+
+    def stream(self, data, username, order=None, type_=None, category=None, date=None, start=None, end=None):
+        # Only newest-first needs the matches collected and sorted first
+        if order == "d":
+            yield from self.find(data, username, order, type_, category, date, start, end)
+            return
+        for t in self.candidates(data, username, date, start, end, order):
+            if matches_filters(t, type_, category):
+                yield t
+
+    def get(self, data, username, tid):
+        return self.id_index(data, username).get(tid)
+
+    def max_id(self, data, username):
+        return max((t["id"] for t in self.transactions(data, username)), default=0)
+
+    def rebase(self, data, entries):
+        # Re-applies changes not written yet on top of data reloaded from
+        # the files. A record added here whose ID another process has used
+        # in the meantime gets the next free one (and later entries that
+        # refer to it follow along).
+        renamed = {}
+        for entry in entries:
+            username = entry["user"]
+            op = entry["op"]
+            if op in ("add", "import"):
+                for t in entry["records"] if op == "import" else [entry["record"]]:
+                    if self.get(data, username, t["id"]) is not None:
+                        new_id = max(data["users"][username].get("next_id", 1), self.max_id(data, username) + 1)
+                        renamed[(username, t["id"])] = new_id
+                        t["id"] = new_id
+            elif op == "edit":
+                entry["id"] = renamed.get((username, entry["id"]), entry["id"])
+            elif op == "delete":
+                entry["ids"] = [renamed.get((username, tid), tid) for tid in entry["ids"]]
+            self.apply(data, entry)
+        return renamed
+
+    def recent(self, data, username, num):
+        transactions = self.transactions(data, username)
+        return transactions[-num:] if num < len(transactions) else list(transactions)
+
+    def count(self, data, username):
+        return len(self.transactions(data, username))
+
+    def totals(self, data, username, group, type_=None, category=None, date=None, start=None, end=None):
+        found = (t for t in self.candidates(data, username, date, start, end) if matches_filters(t, type_, category))
+        return aggregate(found, bucket=lambda t: t[group] if group else None)["buckets"]
+
+class JsonStorage(MemoryStorage):
+    def files(self, username):
+        return [DATA_FILE, JOURNAL_FILE]
+
+    def load(self):
+        with data_lock:
+            data = self.read_disk()
+            if data.pop("_snapshot_scanned", False):
+                self.save(data)  # Add the index so the next load skips the scan
+        return data
+
+    def read_disk(self):
+        data = read_snapshot()
+        data["_disk_stamp"] = file_stamps(self.files(None))
+        # Replaying an entry loads that user's transactions first
+        replay_journal(data, self.apply)
+        return data
+
+    def catch_up(self, data):
+        # Called with data_lock held. If another process wrote since this
+        # one last read or wrote the files, start over from what they hold
+        # now and re-apply the changes not written yet.
+        if file_stamps(self.files(None)) == data["_disk_stamp"]:
+            return
+        fresh = self.read_disk()
+        fresh.pop("_snapshot_scanned", None)
+        self.rebase(fresh, data.get("_journal_pending", []))
+        drop_user_caches(data)
+        data.update(fresh)
+        index_emails(data)
+
+    def transactions(self, data, username):
+        if username not in data["transactions"]:
+            span = data["_snapshot_spans"].get(username)
+            if span is None:
+                return []
+            if file_stamps([DATA_FILE])[0] != data["_disk_stamp"][0]:
+                # The snapshot was rewritten since the spans were read
+                with data_lock:
+                    self.catch_up(data)
+                return self.transactions(data, username)
+            data["transactions"][username] = read_snapshot_records(span)
+            del data["_snapshot_spans"][username]
+        return data["transactions"][username]
+
+    def load_all(self, data):
+        for username in list(data["_snapshot_spans"]):
+            self.transactions(data, username)
+
+    def write_snapshot(self, data, file, spans):
+        # Same layout as json.dump(..., indent=4); arrays that were never
+        # loaded are copied byte for byte from the current file, and their
+        # new positions are stored in spans
+        old = data["_snapshot_spans"]
+        usernames = list(data["transactions"]) + [username for username in old if username not in data["transactions"]]
+        positions = {username: (0, 0) for username in usernames}
+        file.write(b"{\n")
+        index_at = file.tell()
+        file.write(snapshot_index(0, positions))
+        for key, value in data.items():
+            # Keys starting with "_" are in-memory bookkeeping and never written out
+            if not key.startswith("_") and key not in ("transactions", "index"):
+                file.write(f"    {json.dumps(key)}: {json.dumps(value, indent=4)},\n".replace("\n", "\n    ")[:-4].encode())
+        file.write(b'    "transactions": {')
+        buf = None
+        if old:
+            source, buf = open_snapshot()
+        try:
+            for i, username in enumerate(usernames):
+                file.write(f'{"," if i else ""}\n        {json.dumps(username)}: '.encode())
+                start = file.tell()
+                if username in data["transactions"]:
+                    records = json.dumps(plain_records(data["transactions"][username]), indent=4)
+                    file.write(records.replace("\n", "\n        ").encode())
+                else:
+                    first, last = old[username]
+                    for chunk in range(first, last, 1 << 20):
+                        file.write(buf[chunk:min(chunk + (1 << 20), last)])
+                    spans[username] = (start, file.tell())
+                positions[username] = (start, file.tell())
+        finally:
+            if buf is not None:
+                buf.close()
+                source.close()
+        file.write(b"\n    }\n}" if usernames else b"}\n}")
+        size = file.tell()
+        file.seek(index_at)
+        file.write(snapshot_index(size, positions))
+
+    def save(self, data):
+        with data_lock:
+            spans = {}
+            write_atomic(DATA_FILE, lambda file: self.write_snapshot(data, file, spans), "wb")
+            data["_snapshot_spans"] = spans
+            # The snapshot now holds every journaled change, so the log can start over
+            if os.path.exists(JOURNAL_FILE):
+                os.remove(JOURNAL_FILE)
+            data["_journal_entries"] = 0
+            data["_journal_pending"] = []
+            data["_disk_stamp"] = file_stamps(self.files(None))
+
+    def commit(self, data, entry):
+        self.apply(data, entry)
+        # Kept until flush() (also without the journal, for catch_up)
+        data.setdefault("_journal_pending", []).append(entry)
+
+    def flush(self, data):
+        pending = data.get("_journal_pending")
+        if not pending:
+            return
+        with data_lock:
+            self.catch_up(data)
+            if not USE_JOURNAL:
+                self.save(data)
+                return
+            # Sequence numbers are given out under the lock, so they follow
+            # on from whatever other processes appended
+            lines = []
+            for entry in pending:
+                data["journal_seq"] += 1
+                lines.append(json.dumps(dict(entry, seq=data["journal_seq"]), separators=(",", ":")) + "\n")
+            with open(JOURNAL_FILE, "ab") as file:
+                # A torn last line has no newline; end it so the new entries
+                # are not glued onto it
+                if file.tell() and not journal_ends_line():
+                    file.write(b"\n")
+                file.write("".join(lines).encode())
+            data["_journal_entries"] = data.get("_journal_entries", 0) + len(pending)
+            data["_journal_pending"] = []
+            if data["_journal_entries"] >= JOURNAL_COMPACT_AT:
+                self.save(data)
+            else:
+                data["_disk_stamp"] = file_stamps(self.files(None))
+
+# --- Sharded storage ---
+# USERS_FILE holds only the account list; each user's transactions live in
+# their own file under SHARD_DIR. A shard is read the first time that user's
+# transactions are needed (i.e. after login) and only that shard is
+# rewritten when the user changes something.
+def shard_path(username):
+    return os.path.join(SHARD_DIR, quote(username, safe="") + ".json")
+
+class ShardedStorage(MemoryStorage):
+    def files(self, username):
+        return [shard_path(username)]
+
+    def load(self):
+        with data_lock:
+            if not os.path.exists(USERS_FILE):
+                self.split_snapshot()
+            stamp = file_stamps([USERS_FILE])
+            with open(USERS_FILE, "r") as file:
+                users = json.load(file)
+        return {"users": users, "transactions": {}, "_users_stamp": stamp, "_shard_stamps": {}}
+
+    def split_snapshot(self):
+        # First run with the sharded backend: split the existing data.json
+        snapshot = JsonStorage()
+        data = snapshot.load()
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        for username in data["users"]:
+            self.save_user(data, username, snapshot.transactions(data, username))
+        self.save_users(data)
+
+    def transactions(self, data, username):
+        if username not in data["transactions"]:
+            # Taken before reading, so a write in between shows up as a change
+            data.setdefault("_shard_stamps", {})[username] = file_stamps(self.files(username))
+            path = shard_path(username)
+            shard = {"transactions": []}
+            if os.path.exists(path):
+                with open(path, "r") as file:
+                    shard = json.load(file)
+                if isinstance(shard, list):
+                    shard = {"transactions": shard}  # Shard written before the ID counter
+            data["transactions"][username] = make_transactions(shard["transactions"])
+            if "next_id" in shard and username in data["users"]:
+                data["users"][username]["next_id"] = shard["next_id"]
+        return data["transactions"][username]
+
+    def save_users(self, data):
+        # The ID counter is stored in each user's shard, not in the index
+        users = {username: {"email": info["email"], "password": info["password"]} for username, info in data["users"].items()}
+        write_json_atomic(USERS_FILE, users, indent=4)
+
+    def save_user(self, data, username, transactions):
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        shard = {"transactions": plain_records(transactions)}
+        if "next_id" in data["users"].get(username, {}):
+            shard["next_id"] = data["users"][username]["next_id"]
+        write_json_atomic(shard_path(username), shard, separators=(",", ":"))
+
+    def save(self, data):
+        with data_lock:
+            self.save_users(data)
+            for username, transactions in data["transactions"].items():
+                self.save_user(data, username, transactions)
+        data["_unsaved_shards"] = set()
+
+    def commit(self, data, entry):
+        username = entry["user"]
+        self.transactions(data, username)  # Make sure the shard is loaded before changing it
+        self.apply(data, entry)
+        if entry["op"] == "user":
+            data["_unsaved_users"] = True
+        data.setdefault("_unsaved_shards", set()).add(username)
+        data.setdefault("_pending", []).append(entry)
+
+    def flush(self, data):
+        pending = data.pop("_pending", [])
+        with data_lock:
+            if data.pop("_unsaved_users", False):
+                if file_stamps([USERS_FILE]) != data.get("_users_stamp"):
+                    # Accounts signed up elsewhere in the meantime
+                    with open(USERS_FILE, "r") as file:
+                        for username, info in json.load(file).items():
+                            data["users"].setdefault(username, info)
+                    index_emails(data)
+                self.save_users(data)
+                data["_users_stamp"] = file_stamps([USERS_FILE])
+            for username in data.get("_unsaved_shards", ()):
+                if file_stamps(self.files(username)) != data["_shard_stamps"].get(username):
+                    # The shard was written elsewhere: reload it and redo
+                    # this process's changes on top
+                    del data["transactions"][username]
+                    drop_user_caches(data, username)
+                    self.transactions(data, username)
+                    self.rebase(data, [entry for entry in pending if entry["user"] == username and entry["op"] != "user"])
+                self.save_user(data, username, data["transactions"][username])
+                data["_shard_stamps"][username] = file_stamps(self.files(username))
+        data["_unsaved_shards"] = set()
+
+# --- Binary storage ---
+# Like the sharded backend, but each user's transactions are kept in
+# SHARD_DIR/<user>.bin in the columnar layout: a header, a JSON block with
+# the name table, description pool, values kept as-is and the ID counter,
+# then one fixed-width block per column (IDs, cents, timestamps, date
+# ordinals, description codes, type and category codes), record i being
+# element i of every block. The file is memory-mapped copy-on-write and the
+# columns are typed memoryviews over it, so a cold start parses no JSON per
+# record, and scans (including the NumPy ones) read the mapped pages
+# directly. The first append copies the columns into arrays.
+BINARY_MAGIC = b"WADSAET\x01"
+BINARY_HEADER = struct.Struct("<8sqq")  # Magic, record count, JSON block length
+BINARY_COLUMNS = (("ids", "q"), ("cents", "q"), ("stamps", "q"), ("days", "i"),
+                  ("descriptions", "i"), ("types", "h"), ("categories", "h"))
+
+def binary_path(username):
+    return os.path.join(SHARD_DIR, quote(username, safe="") + ".bin")
+
+def padded(size):
+    return -size % 8  # Keeps every block 8-byte aligned
+
+def map_transactions(path):
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    magic, count, meta_size = BINARY_HEADER.unpack_from(mapping, 0)
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"{path} is not a transactions file")
+    offset = BINARY_HEADER.size
+    meta = json.loads(mapping[offset:offset + meta_size])
+    offset += meta_size + padded(meta_size)
+    transactions = ColumnarTransactions()
+    buffer = memoryview(mapping)
+    for name, code in BINARY_COLUMNS:
+        size = count * array(code).itemsize
+        setattr(transactions, name, buffer[offset:offset + size].cast(code))
+        offset += size + padded(size)
+    transactions.mapping = mapping
+    if sys.byteorder == "big":
+        transactions.thaw()
+        for name, _ in BINARY_COLUMNS:
+            getattr(transactions, name).byteswap()
+    transactions.names = meta["names"]
+    transactions.name_codes = {name: code for code, name in enumerate(transactions.names)}
+    transactions.pool = meta["pool"]
+    transactions.pool_codes = {text: code for code, text in enumerate(transactions.pool)}
+    transactions.extras = {int(slot): extra for slot, extra in meta["extras"].items()}
+    transactions.order = array("i", range(count))
+    return transactions, meta.get("next_id")
+
+def write_transactions(file, transactions, next_id):
+    # Live records only, in list order, so a reloaded file has no gaps
+    order = transactions.order
+    compact = len(order) == len(transactions.ids) and order == array("i", range(len(order)))
+    if compact:
+        extras = transactions.extras
+    else:
+        positions = {slot: i for i, slot in enumerate(order)}
+        extras = {positions[slot]: extra for slot, extra in transactions.extras.items() if slot in positions}
+    meta = {"names": transactions.names, "pool": transactions.pool, "extras": extras}
+    if next_id is not None:
+        meta["next_id"] = next_id
+    meta = json.dumps(meta, separators=(",", ":")).encode()
+    file.write(BINARY_HEADER.pack(BINARY_MAGIC, len(order), len(meta)))
+    file.write(meta + bytes(padded(len(meta))))
+    for name, code in BINARY_COLUMNS:
+        column = getattr(transactions, name)
+        if not compact or sys.byteorder == "big":
+            column = array(code, [column[slot] for slot in order])
+            if sys.byteorder == "big":
+                column.byteswap()
+        file.write(column)
+        file.write(bytes(padded(len(order) * array(code).itemsize)))
+
+class BinaryStorage(ShardedStorage):
+    def files(self, username):
+        return [binary_path(username), shard_path(username)]
+
+    def transactions(self, data, username):
+        if username not in data["transactions"]:
+            data.setdefault("_shard_stamps", {})[username] = file_stamps(self.files(username))
+            path = binary_path(username)
+            if not os.path.exists(path):
+                # No binary file yet: start from the JSON shard, if any
+                records = super().transactions(data, username)
+                if not isinstance(records, ColumnarTransactions):
+                    data["transactions"][username] = ColumnarTransactions(records)
+                return data["transactions"][username]
+            transactions, next_id = map_transactions(path)
+            data["transactions"][username] = transactions
+            if next_id is not None and username in data["users"]:
+                data["users"][username]["next_id"] = next_id
+        return data["transactions"][username]
+
+    def save_user(self, data, username, transactions):
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        if not isinstance(transactions, ColumnarTransactions):
+            transactions = ColumnarTransactions(transactions)
+        transactions.thaw()  # A mapped file cannot be replaced on Windows
+        next_id = data["users"].get(username, {}).get("next_id")
+        write_atomic(binary_path(username), lambda file: write_transactions(file, transactions, next_id), "wb")
+
+# --- SQLite storage ---
+# Transactions live in data.db and are never loaded all at once; only the
+# users table is read into data["users"]. The (user, date) and
+# (user, category) indexes serve the history filters and totals.
+TRANSACTION_FIELDS = ("id", "date", "type", "amount", "category", "description", "timestamp")
+
+class SqliteStorage:
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                username TEXT PRIMARY KEY,
+                email TEXT NOT NULL,
+                password TEXT NOT NULL,
+                next_id INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS transactions (
+                user TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                type TEXT NOT NULL,
+                amount REAL NOT NULL,
+                category TEXT NOT NULL,
+                description TEXT,
+                timestamp TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions (user, date);
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions (user, category);
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_id ON transactions (user, id);
+            CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+        """)
+        # Databases created before the ID counter lack the next_id column
+        if "next_id" not in [row["name"] for row in self.conn.execute("PRAGMA table_info(users)")]:
+            self.conn.execute("ALTER TABLE users ADD COLUMN next_id INTEGER")
+
+    def files(self, username):
+        return [self.path]
+
+    def load(self):
+        # First run with the SQLite backend: import the existing JSON data once
+        if not self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            snapshot = JsonStorage()
+            data = snapshot.load()
+            snapshot.load_all(data)
+            self.import_json(data)
+        data = {"users": {}, "transactions": {}}
+        for row in self.conn.execute("SELECT username, email, password, next_id FROM users"):
+            data["users"][row["username"]] = {"email": row["email"], "password": row["password"]}
+            if row["next_id"] is not None:
+                data["users"][row["username"]]["next_id"] = row["next_id"]
+        return data
+
+    def import_json(self, data):
+        with self.conn:
+            for username, info in data["users"].items():
+                self.conn.execute("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)", (username, info["email"], info["password"], info.get("next_id")))
+            for username, transactions in data["transactions"].items():
+                self.conn.executemany(
+                    "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((username, *(t.get(f) for f in TRANSACTION_FIELDS)) for t in transactions))
+
+    def save(self, data):
+        self.flush(data)
+
+    def flush(self, data):
+        # The whole batch in one transaction, taken only for as long as the
+        # writes last so command-line runs are not locked out in between
+        pending = data.pop("_pending", None)
+        if not pending:
+            return
+        try:
+            with data_lock, self.conn:
+                renamed = self.rebase(data, pending)
+        except BaseException:
+            data["_pending"] = pending + data.get("_pending", [])
+            raise
+        for username, _ in renamed:
+            drop_user_caches(data, username)
+
+    # Records whose IDs were used by another process in the meantime are
+    # renumbered, as for the in-memory backends
+    rebase = MemoryStorage.rebase
+
+    def commit(self, data, entry):
+        # Only queued here; reads write the queue out first (see execute())
+        op = entry["op"]
+        username = entry["user"]
+        if op == "user":
+            data["users"][username] = {"email": entry["email"], "password": entry["password"]}
+        elif op in ("add", "import"):
+            for t in entry["records"] if op == "import" else [entry["record"]]:
+                bump_next_id(data, username, t["id"])
+        data.setdefault("_pending", []).append(entry)
+
+    def execute(self, data, sql, params=()):
+        self.flush(data)
+        return self.conn.execute(sql, params)
+
+    def apply(self, data, entry):
+        op = entry["op"]
+        username = entry["user"]
+        if op == "user":
+            self.conn.execute("INSERT OR REPLACE INTO users (username, email, password) VALUES (?, ?, ?)", (username, entry["email"], entry["password"]))
+        elif op in ("add", "import"):
+            records = entry["records"] if op == "import" else [entry["record"]]
+            self.conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                  ((username, *(t.get(f) for f in TRANSACTION_FIELDS)) for t in records))
+            for t in records:
+                bump_next_id(data, username, t["id"])
+            self.conn.execute("UPDATE users SET next_id = MAX(COALESCE(next_id, 0), ?) WHERE username = ?", (data["users"][username]["next_id"], username))
+        elif op == "edit":
+            changes = {f: v for f, v in entry["changes"].items() if f in TRANSACTION_FIELDS}
+            if changes:
+                assignments = ", ".join(f"{f} = ?" for f in changes)
+                self.conn.execute(f"UPDATE transactions SET {assignments} WHERE user = ? AND id = ?", (*changes.values(), username, entry["id"]))
+        elif op == "delete":
+            self.conn.executemany("DELETE FROM transactions WHERE user = ? AND id = ?", ((username, tid) for tid in entry["ids"]))
+        elif op == "clear":
+            self.conn.execute("DELETE FROM transactions WHERE user = ?", (username,))
+
+    def where(self, username, type_=None, category=None, date=None, start=None, end=None):
+        clauses = ["user = ?"]
+        params = [username]
+        for clause, value in (("type = ?", type_), ("category = ?", category), ("date = ?", date), ("date >= ?", start), ("date <= ?", end)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return " AND ".join(clauses), params
+
+    def rows(self, data, sql, params):
+        return [dict(row) for row in self.execute(data, sql, params)]
+
+    def find(self, data, username, order=None, **filters):
+        return list(self.stream(data, username, order, **filters))
+
+    def stream(self, data, username, order=None, **filters):
+        # Rows come straight off the cursor
+        where, params = self.where(username, **filters)
+        order_by = "rowid"
+        if order:
+            order_by = "date DESC, rowid" if order == "d" else "date, rowid"
+        for row in self.execute(data, f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE {where} ORDER BY {order_by}", params):
+            yield dict(row)
+
+    def query(self, data, username, plan):
+        # The date and ID bounds are repeated as plain conditions so SQLite
+        # can pick the (user, date) or (user, id) index even under an OR
+        clauses = ["user = ?"]
+        params = [username]
+        if plan["start"]:
+            clauses.append("date >= ?")
+            params.append(plan["start"])
+        if plan["end"]:
+            clauses.append("date <= ?")
+            params.append(plan["end"])
+        if plan["ids"] is not None:
+            clauses.append(f"id IN ({', '.join('?' * len(plan['ids']))})")
+            params.extend(plan["ids"])
+        clauses.append(f"({plan['sql']})")
+        order_by = "date, rowid" if plan["start"] or plan["end"] else "rowid"
+        return self.rows(data, f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE {' AND '.join(clauses)} ORDER BY {order_by}", params + plan["params"])
+
+    def get(self, data, username, tid):
+        found = self.rows(data, f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE user = ? AND id = ? ORDER BY rowid LIMIT 1", (username, tid))
+        return found[0] if found else None
+
+    def recent(self, data, username, num):
+        found = self.rows(data, f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE user = ? ORDER BY rowid DESC LIMIT ?", (username, num))
+        return found[::-1]
+
+    def count(self, data, username):
+        return self.execute(data, "SELECT COUNT(*) FROM transactions WHERE user = ?", (username,)).fetchone()[0]
+
+    def max_id(self, data, username):
+        return self.execute(data, "SELECT MAX(id) FROM transactions WHERE user = ?", (username,)).fetchone()[0] or 0
+
+    def totals(self, data, username, group, **filters):
+        where, params = self.where(username, **filters)
+        key = group if group else "NULL"
+        groups = {}
+        sql = f"SELECT {key}, type, SUM(CAST(ROUND(amount * 100) AS INTEGER)) FROM transactions WHERE {where} GROUP BY {key}, type"
+        for row in self.execute(data, sql, params):
+            sums = groups.setdefault(row[0], {"Income": 0, "Expense": 0})
+            sums[row[1]] += row[2] / 100
+        return groups
+
+    def aggregates(self, data, username):
+        # The aggregate cache (see new_aggregates) from one grouped query
+        # instead of every row
+        aggregates = new_aggregates()
+        sql = ("SELECT date, type, category, SUM(CAST(ROUND(amount * 100) AS INTEGER)), COUNT(*) FROM transactions "
+               "WHERE user = ? GROUP BY date, type, category")
+        for row in self.execute(data, sql, (username,)):
+            count_group(aggregates, *row)
+        return aggregates
+
+# --- CSV import ---
+# Rows are streamed from the file through a chain of generators (read,
+# validate, drop duplicates) and committed as one "import" change, so
+# tens of thousands of rows cost a single write. IMPORT_COLUMNS maps each
+# field to its CSV header; without a type column the sign of the amount
+# decides (negative is an expense, as on bank statements).
+IMPORT_COLUMNS = {"date": "date", "type": "type", "amount": "amount", "category": "category", "description": "description"}
+IMPORT_DATE_FORMAT = "%Y-%m-%d"
+IMPORT_NUMBER = re.compile(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)")
+
+def read_import_rows(path, columns=IMPORT_COLUMNS):
+    # (line number, {field: raw text}) for each CSV row
+    with open(path, "r", newline="", encoding="utf-8-sig") as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, {field: (row.get(header) or "").strip() for field, header in columns.items()}
+
+def import_amount(text):
+    # Currency symbols, spaces and thousands separators are dropped and
+    # "(12.00)" is the accounting spelling of -12.00; anything else has to
+    # be a plain number
+    text = "".join(ch for ch in text if not (ch.isspace() or ch == "," or unicodedata.category(ch) == "Sc"))
+    if text.startswith("(") and text.endswith(")"):
+        text = "-" + text[1:-1]
+    if not IMPORT_NUMBER.fullmatch(text):
+        raise ValueError(f"not a number: {text!r}")
+    return float(text)
+
+def parse_import_row(row):
+    # The record a CSV row stands for (without ID and timestamp), or the
+    # reason it cannot be imported
+    try:
+        date = datetime.strptime(row["date"], IMPORT_DATE_FORMAT).strftime("%Y-%m-%d")
+    except ValueError:
+        return None, f"invalid date {row['date']!r}"
+    try:
+        amount = import_amount(row["amount"])
+    except ValueError:
+        return None, f"invalid amount {row['amount']!r}"
+    if not math.isfinite(amount):
+        return None, f"invalid amount {row['amount']!r}"
+    type_ = row["type"].capitalize()
+    if not type_:
+        type_ = "Expense" if amount < 0 else "Income"
+    if type_ not in CATEGORIES:
+        return None, f"unknown type {row['type']!r}"
+    amount = abs(amount)
+    if amount == 0:
+        return None, "amount must be greater than 0"
+    # Categories are matched against the fixed lists, ignoring case
+    category = next((cat for cat in CATEGORIES[type_] if cat.lower() == row["category"].lower()), None)
+    if category is None:
+        return None, f"unknown {type_.lower()} category {row['category']!r}"
+    return {"date": date, "type": type_, "amount": amount, "category": category,
+            "description": row["description"] or "N/A"}, None
+
+def record_key(t):
+    return t["date"], t["type"], amount_cents(t), t["category"], t["description"]
+
+def import_records_from(data, username, rows, skipped):
+    # Valid, new records. Rows that fail validation go to skipped["rejected"]
+    # as (line number, reason) and duplicates are counted in
+    # skipped["duplicates"]. A row matching an existing record is skipped
+    # once per match, so importing the same file twice adds nothing while
+    # repeated rows within one file are kept.
+    existing = {}
+    for t in iter_transactions(data, username):
+        key = record_key(t)
+        existing[key] = existing.get(key, 0) + 1
+    for line, row in rows:
+        record, reason = parse_import_row(row)
+        if record is None:
+            skipped["rejected"].append((line, reason))
+            continue
+        key = record_key(record)
+        if existing.get(key):
+            existing[key] -= 1
+            skipped["duplicates"] += 1
+            continue
+        yield record
+
+def import_csv(data, username, path, columns=IMPORT_COLUMNS):
+    # Returns (records added, duplicates skipped, rejected rows)
+    skipped = {"duplicates": 0, "rejected": []}
+    first = next_transaction_id(data, username)
+    timestamp = datetime.now().isoformat()
+    records = [dict({"id": first + i}, **t, timestamp=timestamp)
+               for i, t in enumerate(import_records_from(data, username, read_import_rows(path, columns), skipped))]
+    if records:
+        commit_change(data, {"op": "import", "user": username, "records": records})
+        flush_changes(data)
+    return len(records), skipped["duplicates"], skipped["rejected"]
+
+# --- Export ---
+# Transactions are written to CSV or JSON Lines as they come out of
+# iter_transactions(), so only the record being written is held (SQLite
+# streams from its cursor; the in-memory backends hand out the records they
+# already hold). Grouped summaries come from group_totals() and are written
+# the same way.
+EXPORT_FORMATS = ("csv", "jsonl")
+SUMMARY_FIELDS = ("period", "income", "expense", "savings")
+
+def write_rows(file, rows, fields, fmt):
+    # Returns the number of rows written
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            file.write(json.dumps(dict(row), ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+def export_rows(path, rows, fields, fmt):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}")
+    return write_atomic(path, lambda file: write_rows(file, rows, fields, fmt), "w", encoding="utf-8", newline="")
+
+def export_transactions(data, username, path, fmt="csv", recent=None, **filters):
+    # filters are those of find_transactions(); recent=N exports the last N
+    # records instead
+    rows = recent_transactions(data, username, recent) if recent else iter_transactions(data, username, **filters)
+    return export_rows(path, rows, TRANSACTION_KEYS, fmt)
+
+def summary_rows(data, username, kind, start=None, end=None, totals=None):
+    # One row per bucket of a history grouping (see GROUPINGS), oldest
+    # first; totals defaults to group_totals() over every record
+    if totals is None:
+        totals = group_totals(data, username, kind, start=start, end=end)
+    for key, sums in sorted(totals.items()):
+        yield {"period": key, "income": sums["Income"], "expense": sums["Expense"], "savings": round(sums["Income"] - sums["Expense"], 2)}
+
+def export_summary(data, username, path, kind, fmt="csv", start=None, end=None):
+    return export_rows(path, summary_rows(data, username, kind, start, end), SUMMARY_FIELDS, fmt)
 
 def is_valid_email(email):
     return bool(re.fullmatch(r"[^@]+@[^@]+\.[^@]+", email))
@@ -102,139 +2619,137 @@ def is_valid_password(password):
 # --- Core Features ---
 def sign_up(data):
     clear_terminal()
-    print(color("Sign Up", C.BOLD))
-    print(color("----------------", C.BOLD))
-    print(color("Create a new user account.", C.DIM))
-    print()
+    screen.print(color("Sign Up", C.BOLD))
+    screen.print(color("----------------", C.BOLD))
+    screen.print(color("Create a new user account.", C.DIM))
+    screen.print()
 
 
 
-    confirm = input("Do you really want to sign up? (y/n): ").lower()
+    confirm = screen.input("Do you really want to sign up? (y/n): ").lower()
     if confirm != "y":
-        print("Returning to main menu...")
-        input("Press Enter to continue...")
+        screen.print("Returning to main menu...")
+        screen.input("Press Enter to continue...")
         clear_terminal()
         return
 
-    email = input("Enter your email: ").strip()
+    email = screen.input("Enter your email: ").strip()
     if not is_valid_email(email):
-        print(color("❌ Invalid email format!", C.RED, C.BOLD))
-        input("Press Enter to continue...")
+        screen.print(color("❌ Invalid email format!", C.RED, C.BOLD))
+        screen.input("Press Enter to continue...")
+        return
+    if email in data["_emails"]:
+        screen.print(color("❌ Email already registered.", C.RED, C.BOLD))
+        screen.input("Press Enter to continue...")
         return
 
-    username = input("Enter username: ").strip()
+    username = screen.input("Enter username: ").strip()
     if username in data["users"]:
-        print(color("❌ Username already exists.", C.RED, C.BOLD))
-        input("Press Enter to continue...")
+        screen.print(color("❌ Username already exists.", C.RED, C.BOLD))
+        screen.input("Press Enter to continue...")
         return
 
     while True:
-        password = input("Enter password (must include A–Z, a–z, and 0–9 only): ").strip()
+        password = screen.input("Enter password (must include A–Z, a–z, and 0–9 only): ").strip()
         if not is_valid_password(password):
-            print(color("❌ Password must have at least one uppercase, one lowercase, one digit, and no special characters.", C.YELLOW))
+            screen.print(color("❌ Password must have at least one uppercase, one lowercase, one digit, and no special characters.", C.YELLOW))
             continue
-        confirm_pass = input("Confirm password: ").strip()
+        confirm_pass = screen.input("Confirm password: ").strip()
         if password != confirm_pass:
-            print(color("❌ Passwords do not match!", C.RED))
+            screen.print(color("❌ Passwords do not match!", C.RED))
             continue
         break
 
-    data["users"][username] = {"email": email, "password": password}
-    data["transactions"][username] = []  # This should now work with the fixed load_data()
-    save_data(data)
-    print(color("✅ Account created successfully!", C.GREEN, C.BOLD))
-    input("Press Enter to return to main menu...")
+    commit_change(data, {"op": "user", "user": username, "email": email, "password": password})
+    screen.print(color("✅ Account created successfully!", C.GREEN, C.BOLD))
+    screen.input("Press Enter to return to main menu...")
 
 def login(data):
     clear_terminal()
-    print(color("Login", C.BOLD))
-    print(color("----------------", C.BOLD))
-    print(color("Log in to your existing account.", C.DIM))
-    print()
+    screen.print(color("Login", C.BOLD))
+    screen.print(color("----------------", C.BOLD))
+    screen.print(color("Log in to your existing account.", C.DIM))
+    screen.print()
 
 
 
-    confirm = input("Do you really want to log in? (y/n): ").lower()
+    confirm = screen.input("Do you really want to log in? (y/n): ").lower()
     if confirm != "y":
-        print("Returning to main menu...")
-        input("Press Enter to continue...")
+        screen.print("Returning to main menu...")
+        screen.input("Press Enter to continue...")
         clear_terminal()
         return
 
-    print(color("\nCredentials", C.BOLD))
-    user_input = input("Enter username or email: ").strip()
+    screen.print(color("\nCredentials", C.BOLD))
+    user_input = screen.input("Enter username or email: ").strip()
     username = None
     if is_valid_email(user_input):
-        # Find username by email
-        for u, info in data["users"].items():
-            if info["email"] == user_input:
-                username = u
-                break
+        username = data["_emails"].get(user_input)
         if not username:
-            print("❌ Email not found.")
-            input("Press Enter to continue...")
+            screen.print("❌ Email not found.")
+            screen.input("Press Enter to continue...")
             return None
     else:
         username = user_input
         if username not in data["users"]:
-            print("❌ Username not found.")
-            input("Press Enter to continue...")
+            screen.print("❌ Username not found.")
+            screen.input("Press Enter to continue...")
             return None
 
-    password = input("Enter password: ").strip()
+    password = screen.input("Enter password: ").strip()
     if password != data["users"][username]["password"]:
-        print(color("❌ Incorrect password.", C.RED))
-        input("Press Enter to continue...")
+        screen.print(color("❌ Incorrect password.", C.RED))
+        screen.input("Press Enter to continue...")
         return None
 
-    print(color("✅ Login successful!", C.GREEN, C.BOLD))
-    input("Press Enter to continue...")
+    screen.print(color("✅ Login successful!", C.GREEN, C.BOLD))
+    screen.input("Press Enter to continue...")
     return username
 
 def add_record(data, username):
     while True:
         clear_terminal()
-        print(color("Add Record", C.BOLD))
-        print(color("----------------", C.BOLD))
-        print(color("Add a new expense or income record.", C.DIM))
-        print()
+        screen.print(color("Add Record", C.BOLD))
+        screen.print(color("----------------", C.BOLD))
+        screen.print(color("Add a new expense or income record.", C.DIM))
+        screen.print()
 
 
 
-        confirm = input("Do you really want to add a record? (y/n): ").lower()
+        confirm = screen.input("Do you really want to add a record? (y/n): ").lower()
         if confirm != "y":
-            print("Returning to main menu...")
-            input("Press Enter to continue...")
+            screen.print("Returning to main menu...")
+            screen.input("Press Enter to continue...")
             clear_terminal()
             return
         clear_terminal()
 
         # Validate date with option for today
         while True:
-            print(color("Date:", C.BOLD))
-            use_today = input("Use today's date? (y/n): ").lower().strip()
+            screen.print(color("Date:", C.BOLD))
+            use_today = screen.input("Use today's date? (y/n): ").lower().strip()
             if use_today == "y":
                 date = datetime.now().strftime("%Y-%m-%d")
                 break
             elif use_today == "n":
-                date = input("Enter date (YYYY-MM-DD): ").strip()
+                date = screen.input("Enter date (YYYY-MM-DD): ").strip()
                 if not date:
-                    print("❌ Date cannot be empty.")
+                    screen.print("❌ Date cannot be empty.")
                     continue
                 try:
                     datetime.strptime(date, "%Y-%m-%d")  # Check format
                     break
                 except ValueError:
-                    print("❌ Invalid date format. Use YYYY-MM-DD (e.g., 2023-10-15).")
+                    screen.print("❌ Invalid date format. Use YYYY-MM-DD (e.g., 2023-10-15).")
             else:
-                print(color("❌ Please enter 'y' or 'n'.", C.YELLOW))
+                screen.print(color("❌ Please enter 'y' or 'n'.", C.YELLOW))
 
         # Validate type with menu for ease
         while True:
-            print(color("\nSelect type:", C.BOLD))
-            print("1. Expense")
-            print("2. Income")
-            type_choice = input("Choose (1 or 2): ").strip()
+            screen.print(color("\nSelect type:", C.BOLD))
+            screen.print("1. Expense")
+            screen.print("2. Income")
+            type_choice = screen.input("Choose (1 or 2): ").strip()
             if type_choice == "1":
                 type_ = "Expense"
                 break
@@ -242,54 +2757,56 @@ def add_record(data, username):
                 type_ = "Income"
                 break
             else:
-                print(color("❌ Invalid choice. Enter 1 for Expense or 2 for Income.", C.RED))
+                screen.print(color("❌ Invalid choice. Enter 1 for Expense or 2 for Income.", C.RED))
 
         # Validate category based on type
         if type_ == "Expense":
-            expense_categories = ["Food & Groceries", "Transportation", "Entertainment", "Personal Needs", "Personal Wants", "Health & Fitness", "Bills", "School/Work"]
-            print(color("\nSelect expense category:", C.BOLD))
+            expense_categories = EXPENSE_CATEGORIES
+            screen.print(color("\nSelect expense category:", C.BOLD))
             for i, cat in enumerate(expense_categories, 1):
-                print(f"{i}. {cat}")
+                screen.print(f"{i}. {cat}")
             while True:
-                cat_choice = input("Choose (1-8): ").strip()
+                cat_choice = screen.input("Choose (1-8): ").strip()
                 if cat_choice.isdigit() and 1 <= int(cat_choice) <= 8:
                     category = expense_categories[int(cat_choice) - 1]
                     break
                 else:
-                    print("❌ Invalid choice. Enter 1-8.")
+                    screen.print("❌ Invalid choice. Enter 1-8.")
         else:  # Income
-            income_categories = ["Allowance", "Work", "Reward", "Gift"]
-            print(color("\nSelect income category:", C.BOLD))
+            income_categories = INCOME_CATEGORIES
+            screen.print(color("\nSelect income category:", C.BOLD))
             for i, cat in enumerate(income_categories, 1):
-                print(f"{i}. {cat}")
+                screen.print(f"{i}. {cat}")
             while True:
-                cat_choice = input("Choose (1-4): ").strip()
+                cat_choice = screen.input("Choose (1-4): ").strip()
                 if cat_choice.isdigit() and 1 <= int(cat_choice) <= 4:
                     category = income_categories[int(cat_choice) - 1]
                     break
                 else:
-                    print("❌ Invalid choice. Enter 1-4.")
+                    screen.print("❌ Invalid choice. Enter 1-4.")
 
         # Validate amount
         while True:
-            amount_input = input("\nEnter amount: ").strip()
+            amount_input = screen.input("\nEnter amount: ").strip()
             if not amount_input:
-                print("❌ Amount cannot be empty. Please enter a valid number.")
+                screen.print("❌ Amount cannot be empty. Please enter a valid number.")
                 continue
             try:
                 amount = float(amount_input)
+                if not math.isfinite(amount):
+                    raise ValueError(amount_input)  # "inf" and "nan" parse as floats
                 if amount <= 0:
-                    print("❌ Amount must be a positive number greater than 0.")
+                    screen.print("❌ Amount must be a positive number greater than 0.")
                     continue
                 break  # Valid input, exit loop
             except ValueError:
-                print("❌ Invalid amount. Please enter a valid number (e.g., 100.50).")
+                screen.print("❌ Invalid amount. Please enter a valid number (e.g., 100.50).")
 
-        desc = input("Add description? (y/n): ").lower().strip()
-        description = input("Enter description: ").strip() if desc == "y" else "N/A"
+        desc = screen.input("Add description? (y/n): ").lower().strip()
+        description = screen.input("Enter description: ").strip() if desc == "y" else "N/A"
 
         transaction = {
-            "id": len(data["transactions"][username]) + 1,
+            "id": next_transaction_id(data, username),
             "date": date,
             "type": type_,
             "amount": amount,
@@ -298,129 +2815,216 @@ def add_record(data, username):
             "timestamp": datetime.now().isoformat()
         }
 
-        data["transactions"][username].append(transaction)
-        save_data(data)
-        print(color("✅ Record added successfully!", C.GREEN, C.BOLD))
+        commit_change(data, {"op": "add", "user": username, "record": transaction})
+        screen.print(color("✅ Record added successfully!", C.GREEN, C.BOLD))
 
-        print()
-        add_another = input("Add another record? (y/n) or press Enter to exit: ").lower().strip()
+        screen.print()
+        add_another = screen.input("Add another record? (y/n) or press Enter to exit: ").lower().strip()
         if add_another == "y":
             clear_terminal()
         else:
             break
-    input("Press Enter to return to main menu...")
+    screen.input("Press Enter to return to main menu...")
+
+# --- History pager ---
+# Long listings are shown PAGE_SIZE records at a time. Pages are pulled from
+# the records iterator only when first shown (and kept for going back), so
+# opening the listing does not depend on the size of the history.
+PAGE_SIZE = 20
+
+def transaction_line(t):
+    return f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}"
+
+def summary_lines(total_income, total_expense):
+    balance = total_income - total_expense
+    bal_color = C.GREEN if balance >= 0 else C.RED
+    return [color("\n---------------- Summary ----------------", C.BOLD),
+            color(f"Total Income: ₱{total_income:.2f}", C.GREEN),
+            color(f"Total Expenses: ₱{total_expense:.2f}", C.RED),
+            color(f"Total Balance: ₱{balance:.2f}", bal_color, C.BOLD),
+            ""]
+
+def page_transactions(header, records, total):
+    # header: lines shown above every page; total: number of records, for
+    # the page count
+    pages = []
+    last = max((total - 1) // PAGE_SIZE, 0)
+    page = 0
+    while True:
+        while len(pages) <= page:
+            chunk = list(islice(records, PAGE_SIZE))
+            if not chunk:
+                break
+            pages.append(chunk)
+        page = min(page, max(len(pages) - 1, 0))
+        clear_terminal()
+        for line in header:
+            screen.print(line)
+        for t in pages[page] if pages else []:
+            screen.print(color(transaction_line(t), C.DIM))
+        screen.print()
+        screen.print(color(f"Page {page + 1} of {last + 1}", C.BOLD))
+        choice = screen.input("[n]ext, [p]revious, page number, or Enter to return: ").strip().lower()
+        if not choice or choice == "q":
+            return
+        if choice == "n" and page < last:
+            page += 1
+        elif choice == "p" and page > 0:
+            page -= 1
+        elif choice.isdigit() and 1 <= int(choice) <= last + 1:
+            page = int(choice) - 1
+
+def period_line(sums, overall, prev_income, prev_expense):
+    # A period's totals with its share of overall and the change from the
+    # period shown before it
+    income_total = sums["Income"]
+    expense_total = sums["Expense"]
+    income_pct = (income_total / overall["Income"] * 100) if overall["Income"] > 0 else 0
+    expense_pct = (expense_total / overall["Expense"] * 100) if overall["Expense"] > 0 else 0
+    income_change = f" ({(income_total - prev_income) / prev_income * 100:.1f}% change)" if prev_income and prev_income > 0 else ""
+    expense_change = f" ({(expense_total - prev_expense) / prev_expense * 100:.1f}% change)" if prev_expense and prev_expense > 0 else ""
+    return f"Total Income: ₱{income_total:.2f} ({color('{:.1f}'.format(income_pct), C.GREEN)}%){income_change} | Total Expense: ₱{expense_total:.2f} ({color('{:.1f}'.format(expense_pct), C.RED)}%){expense_change} | Savings: ₱{income_total - expense_total:.2f}"
+
+def browse_periods(data, username, kind, start, end, order, overall):
+    # One line of totals per month, quarter or year (see group_totals);
+    # picking one pages through its records
+    totals = group_totals(data, username, kind, start=start, end=end)
+    keys = sorted(totals, reverse=(order == "d"))
+    if not keys:
+        screen.print("No transactions match the filter.")
+        screen.input("Press Enter to return to main menu...")
+        return
+    while True:
+        clear_terminal()
+        prev_income = None
+        prev_expense = None
+        for i, key in enumerate(keys, 1):
+            screen.print(color(f"\n{i}. ---------------- {key} ----------------", C.BOLD))
+            screen.print(period_line(totals[key], overall, prev_income, prev_expense))
+            prev_income = totals[key]["Income"]
+            prev_expense = totals[key]["Expense"]
+        sums = {type_: sum(totals[key][type_] for key in keys) for type_ in ("Income", "Expense")}
+        for line in summary_lines(sums["Income"], sums["Expense"]):
+            screen.print(line)
+        choice = screen.input(f"Choose a {kind} (1-{len(keys)}) to list its records, or Enter to return: ").strip()
+        if not choice:
+            return
+        if not choice.isdigit() or not 1 <= int(choice) <= len(keys):
+            continue
+        key = keys[int(choice) - 1]
+        first, last = period_range(kind, key)
+        first = max(first, start) if start else first
+        last = min(last, end) if end else last
+        days = get_aggregates(data, username)["days"]
+        count = sum(day["count"] for date, day in days.items() if first <= date <= last)
+        header = [color(f"---------------- {key} ----------------", C.WHITE, C.BOLD), period_line(totals[key], overall, None, None)]
+        page_transactions(header, iter_transactions(data, username, start=first, end=last, order=order), count)
 
 def view_history(data, username):
     clear_terminal()
-    print(color("View History", C.BOLD))
-    print(color("----------------", C.BOLD))
-    print(color("View your transaction history.", C.DIM))
-    print()
+    screen.print(color("View History", C.BOLD))
+    screen.print(color("----------------", C.BOLD))
+    screen.print(color("View your transaction history.", C.DIM))
+    screen.print()
 
 
 
-    transactions = data["transactions"][username]
-    if not transactions:
-        print("No transactions found.")
-        input("Press Enter to return to main menu...")
+    if not count_transactions(data, username):
+        screen.print("No transactions found.")
+        screen.input("Press Enter to return to main menu...")
         return
 
-    print(color("Filter options:", C.BOLD))
-    print("1. All transactions")
-    print("2. By category")
-    print("3. By date")
-    print("4. By type (Expense/Income)")
-    print("5. Recent transactions")
-    print("6. By specific date")
-    filter_choice = input("Choose filter (1-6): ").strip()
+    screen.print(color("Filter options:", C.BOLD))
+    screen.print("1. All transactions")
+    screen.print("2. By category")
+    screen.print("3. By date")
+    screen.print("4. By type (Expense/Income)")
+    screen.print("5. Recent transactions")
+    screen.print("6. By specific date")
+    screen.print("7. Custom filter")
+    screen.print("8. Search descriptions")
+    filter_choice = screen.input("Choose filter (1-8): ").strip()
 
-    filtered = transactions
+    filtered = []
 
     if filter_choice == "2":
         clear_terminal()
-        print(color("Select type:", C.BOLD))
-        print(color("1. Expense", C.WHITE))
-        print(color("2. Income", C.WHITE))
-        type_choice = input("Choose (1 or 2): ").strip()
+        screen.print(color("Select type:", C.BOLD))
+        screen.print(color("1. Expense", C.WHITE))
+        screen.print(color("2. Income", C.WHITE))
+        type_choice = screen.input("Choose (1 or 2): ").strip()
         if type_choice == "1":
             type_ = "Expense"
-            categories = ["Food & Groceries", "Transportation", "Entertainment", "Personal Needs", "Personal Wants", "Health & Fitness", "Bills", "School/Work"]
+            categories = EXPENSE_CATEGORIES
         elif type_choice == "2":
             type_ = "Income"
-            categories = ["Allowance", "Work", "Reward", "Gift"]
+            categories = INCOME_CATEGORIES
         else:
-            print(color("❌ Invalid choice.", C.RED))
-            input("Press Enter to continue...")
+            screen.print(color("❌ Invalid choice.", C.RED))
+            screen.input("Press Enter to continue...")
             return
         # Calculate percentages for categories
-        overall_total = sum(t["amount"] for t in transactions if t["type"] == type_)
-        category_totals = {}
-        for cat in categories:
-            category_totals[cat] = sum(t["amount"] for t in transactions if t["category"] == cat and t["type"] == type_)
-        print(color(f"\nSelect category for {type_}:", C.BOLD))
+        overall_total = type_totals(data, username)[type_]
+        totals_by_category = category_totals(data, username, type_)
+        screen.print(color(f"\nSelect category for {type_}:", C.BOLD))
         for i, cat in enumerate(categories, 1):
-            pct = (category_totals[cat] / overall_total * 100) if overall_total > 0 else 0
-            print(color(f"{i}. {cat} ({pct:.1f}%)", C.WHITE))
-        cat_choice = input(f"Choose (1-{len(categories)}): ").strip()
+            pct = (totals_by_category.get(cat, 0) / overall_total * 100) if overall_total > 0 else 0
+            screen.print(color(f"{i}. {cat} ({pct:.1f}%)", C.WHITE))
+        cat_choice = screen.input(f"Choose (1-{len(categories)}): ").strip()
         if cat_choice.isdigit() and 1 <= int(cat_choice) <= len(categories):
             category = categories[int(cat_choice) - 1]
-            filtered = [t for t in transactions if t["category"] == category and t["type"] == type_]
-            category_total = category_totals[category]
+            filtered = find_transactions(data, username, type_=type_, category=category)
+            category_total = totals_by_category.get(category, 0)
             pct = (category_total / overall_total * 100) if overall_total > 0 else 0
             clear_terminal()
-            print(color(f"---------------- {category} ({pct:.1f}%) ----------------", C.WHITE, C.BOLD))
+            screen.print(color(f"---------------- {category} ({pct:.1f}%) ----------------", C.WHITE, C.BOLD))
             # Summary total in white at the top
-            print(color(f"Total for {category}: ₱{category_total:.2f}", C.WHITE))
+            screen.print(color(f"Total for {category}: ₱{category_total:.2f}", C.WHITE))
             # Display transactions
             for t in filtered:
-                print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
+                screen.print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
             # Calculate and display summary
-            total_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-            total_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
+            sums = filtered_totals(data, username, type_=type_, category=category)
+            total_income = sums["Income"]
+            total_expense = sums["Expense"]
             balance = total_income - total_expense
-            print()
-            print(color("---------------- Summary ----------------", C.BOLD))
-            print(color(f"Total Income: ₱{total_income:.2f}", C.GREEN))
-            print(color(f"Total Expenses: ₱{total_expense:.2f}", C.RED))
+            screen.print()
+            screen.print(color("---------------- Summary ----------------", C.BOLD))
+            screen.print(color(f"Total Income: ₱{total_income:.2f}", C.GREEN))
+            screen.print(color(f"Total Expenses: ₱{total_expense:.2f}", C.RED))
             bal_color = C.GREEN if balance >= 0 else C.RED
-            print(color(f"Total Balance: ₱{balance:.2f}", bal_color, C.BOLD))
-            print()
-            input("Press Enter to return to main menu...")
+            screen.print(color(f"Total Balance: ₱{balance:.2f}", bal_color, C.BOLD))
+            screen.print()
+            screen.input("Press Enter to return to main menu...")
             return
         else:
-            print(color("❌ Invalid choice.", C.RED))
-            input("Press Enter to continue...")
+            screen.print(color("❌ Invalid choice.", C.RED))
+            screen.input("Press Enter to continue...")
             return
     elif filter_choice == "3":
         clear_terminal()
-        print(color("Choose date filter:", C.BOLD))
-        print(color("1. Today's transactions", C.WHITE))
-        print(color("2. Yesterday's transactions", C.WHITE))
-        print(color("3. By Day (how many days?)", C.WHITE))
-        print(color("4. By Week (how many weeks?)", C.WHITE))
-        print(color("5. By Month (how many months?)", C.WHITE))
-        print(color("6. By Year (how many years?)", C.WHITE))
-        group_choice = input("Choose (1-6): ").strip()
-
-        def ymd_keys(d):
-        # Returns (year, month, day)
-            try:
-                dt = datetime.strptime(d, "%Y-%m-%d")
-                return dt.year, dt.month, dt.day
-            except Exception:
-                # Fallback if date is malformed
-                parts = d.split("-")
-                y = int(parts[0]) if len(parts) > 0 and parts[0].isdigit() else 0
-                m = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
-                dd = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
-                return y, m, dd
-
-        order = input("Ascending or Descending by date (a/d): ").lower().strip()
-        filtered = sorted(filtered, key=lambda x: x["date"], reverse=(order == "d"))
+        screen.print(color("Choose date filter:", C.BOLD))
+        screen.print(color("1. Today's transactions", C.WHITE))
+        screen.print(color("2. Yesterday's transactions", C.WHITE))
+        screen.print(color("3. By Day (how many days?)", C.WHITE))
+        screen.print(color("4. By Week (how many weeks?)", C.WHITE))
+        screen.print(color("5. By Month (how many months?)", C.WHITE))
+        screen.print(color("6. By Year (how many years?)", C.WHITE))
+        screen.print(color("7. By Quarter (how many quarters?)", C.WHITE))
+        screen.print(color("8. By N-Day Window (custom length)", C.WHITE))
+        group_choice = screen.input("Choose (1-8): ").strip()
+        groupings = {"3": ("day", "days"), "4": ("week", "weeks"), "5": ("month", "months"), "6": ("year", "years"),
+                     "7": ("quarter", "quarters"), "8": ("window", "windows")}
+
+        order = screen.input("Ascending or Descending by date (a/d): ").lower().strip()
+        order = "d" if order == "d" else "a"
 
         # Calculate overall totals for percentages
-        total_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-        total_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
+        overall = type_totals(data, username)
+        total_income = overall["Income"]
+        total_expense = overall["Expense"]
+        # The summary below covers every transaction unless a single day is picked
+        summary = overall
 
         prev_income = None
         prev_expense = None
@@ -430,145 +3034,61 @@ def view_history(data, username):
             clear_terminal()
             today = datetime.now().strftime("%Y-%m-%d")
             yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
-            filtered = [t for t in transactions if t["date"] == today]
-            print(color(f"\n---------------- {today} ----------------", C.BOLD))
+            filtered = find_transactions(data, username, date=today)
+            summary = filtered_totals(data, username, date=today)
+            screen.print(color(f"\n---------------- {today} ----------------", C.BOLD))
             if filtered:
-                today_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-                today_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
-                yesterday_income = sum(t["amount"] for t in transactions if t["date"] == yesterday and t["type"] == "Income")
-                yesterday_expense = sum(t["amount"] for t in transactions if t["date"] == yesterday and t["type"] == "Expense")
+                today_income = summary["Income"]
+                today_expense = summary["Expense"]
+                yesterday_totals = type_totals(data, username, date=yesterday)
+                yesterday_income = yesterday_totals["Income"]
+                yesterday_expense = yesterday_totals["Expense"]
                 income_pct = (today_income / total_income * 100) if total_income > 0 else 0
                 expense_pct = (today_expense / total_expense * 100) if total_expense > 0 else 0
                 income_change = f" ({(today_income - yesterday_income) / yesterday_income * 100:.1f}% change)" if yesterday_income > 0 else ""
                 expense_change = f" ({(today_expense - yesterday_expense) / yesterday_expense * 100:.1f}% change)" if yesterday_expense > 0 else ""
-                print(f"Total Income: ₱{today_income:.2f} ({color('{:.1f}'.format(income_pct), C.GREEN)}%){income_change} | Total Expense: ₱{today_expense:.2f} ({color('{:.1f}'.format(expense_pct), C.RED)}%){expense_change} | Savings: ₱{today_income - today_expense:.2f}")
+                screen.print(f"Total Income: ₱{today_income:.2f} ({color('{:.1f}'.format(income_pct), C.GREEN)}%){income_change} | Total Expense: ₱{today_expense:.2f} ({color('{:.1f}'.format(expense_pct), C.RED)}%){expense_change} | Savings: ₱{today_income - today_expense:.2f}")
             for t in filtered:
-                print(color(f"  [{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
+                screen.print(color(f"  [{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
         elif group_choice == "2":
             # Yesterday's transactions
             clear_terminal()
             yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
             day_before = (datetime.now() - timedelta(days=2)).strftime("%Y-%m-%d")
-            filtered = [t for t in transactions if t["date"] == yesterday]
-            print(color(f"\n---------------- {yesterday} ----------------", C.BOLD))
+            filtered = find_transactions(data, username, date=yesterday)
+            summary = filtered_totals(data, username, date=yesterday)
+            screen.print(color(f"\n---------------- {yesterday} ----------------", C.BOLD))
             if filtered:
-                yesterday_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-                yesterday_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
-                day_before_income = sum(t["amount"] for t in transactions if t["date"] == day_before and t["type"] == "Income")
-                day_before_expense = sum(t["amount"] for t in transactions if t["date"] == day_before and t["type"] == "Expense")
+                yesterday_income = summary["Income"]
+                yesterday_expense = summary["Expense"]
+                day_before_totals = type_totals(data, username, date=day_before)
+                day_before_income = day_before_totals["Income"]
+                day_before_expense = day_before_totals["Expense"]
                 income_pct = (yesterday_income / total_income * 100) if total_income > 0 else 0
                 expense_pct = (yesterday_expense / total_expense * 100) if total_expense > 0 else 0
                 income_change = f" ({(yesterday_income - day_before_income) / day_before_income * 100:.1f}% change)" if day_before_income > 0 else ""
                 expense_change = f" ({(yesterday_expense - day_before_expense) / day_before_expense * 100:.1f}% change)" if day_before_expense > 0 else ""
-                print(f"Total Income: ₱{yesterday_income:.2f} ({color('{:.1f}'.format(income_pct), C.GREEN)}%){income_change} | Total Expense: ₱{yesterday_expense:.2f} ({color('{:.1f}'.format(expense_pct), C.RED)}%){expense_change} | Savings: ₱{yesterday_income - yesterday_expense:.2f}")
+                screen.print(f"Total Income: ₱{yesterday_income:.2f} ({color('{:.1f}'.format(income_pct), C.GREEN)}%){income_change} | Total Expense: ₱{yesterday_expense:.2f} ({color('{:.1f}'.format(expense_pct), C.RED)}%){expense_change} | Savings: ₱{yesterday_income - yesterday_expense:.2f}")
             for t in filtered:
-                print(color(f"  [{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
-        elif group_choice == "3":
-            # Group by day (YYYY-MM-DD)
-            while True:
-                num_input = input("How many days? (enter number or 'all'): ").strip().lower()
-                if not num_input:
-                    print("❌ Input cannot be empty.")
-                    continue
-                if num_input == 'all':
-                    num = None  # Will handle all
-                    break
-                try:
-                    num = int(num_input)
-                    if num <= 0:
-                        print("❌ Number must be a positive integer.")
-                        continue
-                    break
-                except ValueError:
-                    print("❌ Invalid input. Enter a positive integer or 'all'.")
-            groups = {}
-            if num is None:
-                # All days
-                for t in filtered:
-                    groups.setdefault(t["date"], []).append(t)
-            else:
-                end_date = datetime.now().date()
-                start_date = end_date - timedelta(days=num)
-                for t in transactions:
-                    dt = datetime.strptime(t["date"], "%Y-%m-%d").date()
-                    if start_date <= dt <= end_date:
-                        groups.setdefault(t["date"], []).append(t)
-            sorted_keys = sorted(groups.keys(), reverse=(order == "d"))
-            prev_income = None
-            prev_expense = None
-            for key in sorted_keys:
-                print(color(f"\n---------------- {key} ----------------", C.BOLD))
-                income_total = sum(x["amount"] for x in groups[key] if x["type"] == "Income")
-                expense_total = sum(x["amount"] for x in groups[key] if x["type"] == "Expense")
-                income_pct = (income_total / total_income * 100) if total_income > 0 else 0
-                expense_pct = (expense_total / total_expense * 100) if total_expense > 0 else 0
-                income_change = f" ({(income_total - prev_income) / prev_income * 100:.1f}% change)" if prev_income and prev_income > 0 else ""
-                expense_change = f" ({(expense_total - prev_expense) / prev_expense * 100:.1f}% change)" if prev_expense and prev_expense > 0 else ""
-                print(f"Total Income: ₱{income_total:.2f} ({color('{:.1f}'.format(income_pct), C.GREEN)}%){income_change} | Total Expense: ₱{expense_total:.2f} ({color('{:.1f}'.format(expense_pct), C.RED)}%){expense_change} | Savings: ₱{income_total - expense_total:.2f}")
-                for t in groups[key]:
-                    print(color(f"  [{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
-                prev_income = income_total
-                prev_expense = expense_total
-        elif group_choice == "4":
-            # Group by week (YYYY-WW)
-            while True:
-                num_input = input("How many weeks? (enter number or 'all'): ").strip().lower()
-                if not num_input:
-                    print("❌ Input cannot be empty.")
-                    continue
-                if num_input == 'all':
-                    num = None  # Will handle all
-                    break
-                try:
-                    num = int(num_input)
-                    if num <= 0:
-                        print("❌ Number must be a positive integer.")
-                        continue
-                    break
-                except ValueError:
-                    print("❌ Invalid input. Enter a positive integer or 'all'.")
-            groups = {}
-            if num is None:
-                # All weeks
-                for t in filtered:
-                    try:
-                        dt = datetime.strptime(t["date"], "%Y-%m-%d")
-                        y, w, _ = dt.isocalendar()
-                        key = f"{y:04d}-W{w:02d}"
-                        groups.setdefault(key, []).append(t)
-                    except:
-                        continue  # Skip malformed dates
+                screen.print(color(f"  [{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
+        elif group_choice in groupings:
+            kind, unit = groupings[group_choice]
+            if kind == "window":
+                # Custom windows of N days, the last one ending today
+                while True:
+                    size_input = screen.input("How many days per window? ").strip()
+                    if size_input.isdigit() and int(size_input) > 0:
+                        size = int(size_input)
+                        break
+                    screen.print("❌ Invalid input. Enter a positive integer.")
+                kind = ("window", size, datetime.now().strftime("%Y-%m-%d"))
+                span = size
             else:
-                end_date = datetime.now().date()
-                start_date = end_date - timedelta(weeks=num)
-                for t in transactions:
-                    dt = datetime.strptime(t["date"], "%Y-%m-%d").date()
-                    if start_date <= dt <= end_date:
-                        y, w, _ = dt.isocalendar()
-                        key = f"{dt.year:04d}-W{w:02d}"
-                        groups.setdefault(key, []).append(t)
-            sorted_keys = sorted(groups.keys(), reverse=(order == "d"))
-            prev_income = None
-            prev_expense = None
-            for key in sorted_keys:
-                print(color(f"\n---------------- {key} ----------------", C.BOLD))
-                income_total = sum(x["amount"] for x in groups[key] if x["type"] == "Income")
-                expense_total = sum(x["amount"] for x in groups[key] if x["type"] == "Expense")
-                income_pct = (income_total / total_income * 100) if total_income > 0 else 0
-                expense_pct = (expense_total / total_expense * 100) if total_expense > 0 else 0
-                income_change = f" ({(income_total - prev_income) / prev_income * 100:.1f}% change)" if prev_income and prev_income > 0 else ""
-                expense_change = f" ({(expense_total - prev_expense) / prev_expense * 100:.1f}% change)" if prev_expense and prev_expense > 0 else ""
-                print(f"Total Income: ₱{income_total:.2f} ({color('{:.1f}'.format(income_pct), C.GREEN)}%){income_change} | Total Expense: ₱{expense_total:.2f} ({color('{:.1f}'.format(expense_pct), C.RED)}%){expense_change} | Savings: ₱{income_total - expense_total:.2f}")
-                for t in groups[key]:
-                    print(color(f"  [{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
-                prev_income = income_total
-                prev_expense = expense_total
-        elif group_choice == "5":
-            # Group by month (YYYY-MM)
+                span = GROUPINGS[kind][1]
             while True:
-                num_input = input("How many months? (enter number or 'all'): ").strip().lower()
+                num_input = screen.input(f"How many {unit}? (enter number or 'all'): ").strip().lower()
                 if not num_input:
-                    print("❌ Input cannot be empty.")
+                    screen.print("❌ Input cannot be empty.")
                     continue
                 if num_input == 'all':
                     num = None  # Will handle all
@@ -576,583 +3096,685 @@ def view_history(data, username):
                 try:
                     num = int(num_input)
                     if num <= 0:
-                        print("❌ Number must be a positive integer.")
+                        screen.print("❌ Number must be a positive integer.")
                         continue
                     break
                 except ValueError:
-                    print("❌ Invalid input. Enter a positive integer or 'all'.")
-            groups = {}
-            if num is None:
-                # All months
-                for t in filtered:
-                    y, m, _ = ymd_keys(t["date"])
-                    key = f"{y:04d}-{m:02d}"
-                    groups.setdefault(key, []).append(t)
-            else:
+                    screen.print("❌ Invalid input. Enter a positive integer or 'all'.")
+            start = end = None
+            if num is not None:
                 end_date = datetime.now().date()
-                start_date = end_date - timedelta(days=num*30)  # Approximate months
-                for t in transactions:
-                    dt = datetime.strptime(t["date"], "%Y-%m-%d").date()
-                    if start_date <= dt <= end_date:
-                        key = f"{dt.year:04d}-{dt.month:02d}"
-                        groups.setdefault(key, []).append(t)
-            sorted_keys = sorted(groups.keys(), reverse=(order == "d"))
+                # Windows cover exactly num windows; the others keep their approximate spans
+                start_date = end_date - timedelta(days=num * span - (1 if isinstance(kind, tuple) else 0))
+                start = start_date.isoformat()
+                end = end_date.isoformat()
+            if kind in ("month", "quarter", "year"):
+                # Totals straight from the monthly rollups; records only for
+                # the period picked
+                browse_periods(data, username, kind, start, end, order, overall)
+                return
+            groups = group_transactions(data, kind, find_transactions(data, username, start=start, end=end, order=order))
+            totals = group_totals(data, username, kind, start=start, end=end)
             prev_income = None
             prev_expense = None
-            for key in sorted_keys:
-                print(color(f"\n---------------- {key} ----------------", C.BOLD))
-                income_total = sum(x["amount"] for x in groups[key] if x["type"] == "Income")
-                expense_total = sum(x["amount"] for x in groups[key] if x["type"] == "Expense")
-                income_pct = (income_total / total_income * 100) if total_income > 0 else 0
-                expense_pct = (expense_total / total_expense * 100) if total_expense > 0 else 0
-                income_change = f" ({(income_total - prev_income) / prev_income * 100:.1f}% change)" if prev_income and prev_income > 0 else ""
-                expense_change = f" ({(expense_total - prev_expense) / prev_expense * 100:.1f}% change)" if prev_expense and prev_expense > 0 else ""
-                print(f"Total Income: ₱{income_total:.2f} ({color('{:.1f}'.format(income_pct), C.GREEN)}%){income_change} | Total Expense: ₱{expense_total:.2f} ({color('{:.1f}'.format(expense_pct), C.RED)}%){expense_change} | Savings: ₱{income_total - expense_total:.2f}")
+            for key in sorted(groups.keys(), reverse=(order == "d")):
+                screen.print(color(f"\n---------------- {key} ----------------", C.BOLD))
+                sums = totals[key]
+                income_total = sums["Income"]
+                expense_total = sums["Expense"]
+                screen.print(period_line(sums, overall, prev_income, prev_expense))
                 for t in groups[key]:
-                    print(color(f"  [{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
-                prev_income = income_total
-                prev_expense = expense_total
-        elif group_choice == "6":
-            # Group by year
-            while True:
-                num_input = input("How many years? (enter number or 'all'): ").strip().lower()
-                if not num_input:
-                    print("❌ Input cannot be empty.")
-                    continue
-                if num_input == 'all':
-                    num = None  # Will handle all
-                    break
-                try:
-                    num = int(num_input)
-                    if num <= 0:
-                        print("❌ Number must be a positive integer.")
-                        continue
-                    break
-                except ValueError:
-                    print("❌ Invalid input. Enter a positive integer or 'all'.")
-            groups = {}
-            if num is None:
-                # All years
-                for t in filtered:
-                    y, _, _ = ymd_keys(t["date"])
-                    groups.setdefault(y, []).append(t)
-            else:
-                end_date = datetime.now().date()
-                start_date = end_date - timedelta(days=num*365)  # Approximate years
-                for t in transactions:
-                    dt = datetime.strptime(t["date"], "%Y-%m-%d").date()
-                    if start_date <= dt <= end_date:
-                        groups.setdefault(dt.year, []).append(t)
-            sorted_keys = sorted(groups.keys(), reverse=(order == "d"))
-            prev_income = None
-            prev_expense = None
-            for y in sorted_keys:
-                print(color(f"\n---------------- {y} ----------------", C.BOLD))
-                income_total = sum(x["amount"] for x in groups[y] if x["type"] == "Income")
-                expense_total = sum(x["amount"] for x in groups[y] if x["type"] == "Expense")
-                income_pct = (income_total / total_income * 100) if total_income > 0 else 0
-                expense_pct = (expense_total / total_expense * 100) if total_expense > 0 else 0
-                income_change = f" ({(income_total - prev_income) / prev_income * 100:.1f}% change)" if prev_income and prev_income > 0 else ""
-                expense_change = f" ({(expense_total - prev_expense) / prev_expense * 100:.1f}% change)" if prev_expense and prev_expense > 0 else ""
-                print(f"Total Income: ₱{income_total:.2f} ({color('{:.1f}'.format(income_pct), C.GREEN)}%){income_change} | Total Expense: ₱{expense_total:.2f} ({color('{:.1f}'.format(expense_pct), C.RED)}%){expense_change} | Savings: ₱{income_total - expense_total:.2f}")
-                for t in groups[y]:
-                    print(color(f"  [{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
+                    screen.print(color(f"  [{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
                 prev_income = income_total
                 prev_expense = expense_total
         else:
             # No grouping
-            for t in filtered:
-                print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
+            for t in find_transactions(data, username, order=order):
+                screen.print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
 
     elif filter_choice == "4":
         clear_terminal()
-        print(color("Select type:", C.BOLD))
-        print(color("1. Expense", C.WHITE))
-        print(color("2. Income", C.WHITE))
-        type_choice = input("Choose (1 or 2): ").strip()
+        screen.print(color("Select type:", C.BOLD))
+        screen.print(color("1. Expense", C.WHITE))
+        screen.print(color("2. Income", C.WHITE))
+        type_choice = screen.input("Choose (1 or 2): ").strip()
         if type_choice == "1":
             type_ = "Expense"
         elif type_choice == "2":
             type_ = "Income"
         else:
-            print(color("❌ Invalid choice.", C.RED))
-            input("Press Enter to continue...")
+            screen.print(color("❌ Invalid choice.", C.RED))
+            screen.input("Press Enter to continue...")
             return
-        filtered = [t for t in transactions if t["type"] == type_]
-        # Calculate overall totals for percentage
-        overall_total = sum(t["amount"] for t in transactions if t["type"] == type_)
-        type_total = sum(t["amount"] for t in filtered)
-        pct = (type_total / overall_total * 100) if overall_total > 0 else 0
-        clear_terminal()
-        print(color(f"---------------- {type_} ({pct:.1f}%) ----------------", C.WHITE, C.BOLD))
-        # Summary total in white at the top
-        print(color(f"Total for {type_}: ₱{type_total:.2f}", C.WHITE))
-        # Display transactions
-        for t in filtered:
-            print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
-        # Calculate and display summary
-        total_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-        total_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
-        balance = total_income - total_expense
-        print()
-        print(color("---------------- Summary ----------------", C.BOLD))
-        print(color(f"Total Income: ₱{total_income:.2f}", C.GREEN))
-        print(color(f"Total Expenses: ₱{total_expense:.2f}", C.RED))
-        bal_color = C.GREEN if balance >= 0 else C.RED
-        print(color(f"Total Balance: ₱{balance:.2f}", bal_color, C.BOLD))
-        print()
-        input("Press Enter to return to main menu...")
+        # Totals and the row count come from the aggregate cache, so the
+        # first page costs the same however long the history is
+        type_total = type_totals(data, username)[type_]
+        pct = 100 if type_total > 0 else 0
+        sums = {"Income": 0, "Expense": 0, type_: type_total}
+        header = [color(f"---------------- {type_} ({pct:.1f}%) ----------------", C.WHITE, C.BOLD),
+                  color(f"Total for {type_}: ₱{type_total:.2f}", C.WHITE),
+                  *summary_lines(sums["Income"], sums["Expense"])]
+        count = get_aggregates(data, username)["types"].get(type_, [0, 0])[1]
+        page_transactions(header, iter_transactions(data, username, type_=type_), count)
         return
     elif filter_choice == "5":
         while True:
             clear_terminal()
-            num_input = input("How many recent transactions? ").strip()
+            num_input = screen.input("How many recent transactions? ").strip()
             if not num_input:
-                print(color("❌ Number cannot be empty.", C.RED))
+                screen.print(color("❌ Number cannot be empty.", C.RED))
                 continue
             try:
                 num = int(num_input)
                 if num <= 0:
-                    print(color("❌ Number must be a positive integer.", C.RED))
+                    screen.print(color("❌ Number must be a positive integer.", C.RED))
                     continue
                 break
             except ValueError:
-                print(color("❌ Invalid number. Please enter a positive integer.", C.RED))
-        filtered = transactions[-num:] if num < len(transactions) else transactions
+                screen.print(color("❌ Invalid number. Please enter a positive integer.", C.RED))
+        filtered = recent_transactions(data, username, num)
         clear_terminal()
-        print(color(f"---------------- Recent {num} Transactions ----------------", C.WHITE, C.BOLD))
+        screen.print(color(f"---------------- Recent {num} Transactions ----------------", C.WHITE, C.BOLD))
         # Summary total in white at the top
-        recent_total_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-        recent_total_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
+        sums = aggregate(filtered)["types"]
+        recent_total_income = sums["Income"]
+        recent_total_expense = sums["Expense"]
         recent_balance = recent_total_income - recent_total_expense
-        print(color(f"Total Income: ₱{recent_total_income:.2f} | Total Expenses: ₱{recent_total_expense:.2f} | Savings: ₱{recent_balance:.2f}", C.WHITE))
+        screen.print(color(f"Total Income: ₱{recent_total_income:.2f} | Total Expenses: ₱{recent_total_expense:.2f} | Savings: ₱{recent_balance:.2f}", C.WHITE))
         # Display transactions
         for t in filtered:
-            print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
-        # Calculate and display summary
-        total_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-        total_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
+            screen.print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
+        # Display summary
+        total_income = recent_total_income
+        total_expense = recent_total_expense
         balance = total_income - total_expense
-        print()
-        print(color("---------------- Summary ----------------", C.BOLD))
-        print(color(f"Total Income: ₱{total_income:.2f}", C.GREEN))
-        print(color(f"Total Expenses: ₱{total_expense:.2f}", C.RED))
+        screen.print()
+        screen.print(color("---------------- Summary ----------------", C.BOLD))
+        screen.print(color(f"Total Income: ₱{total_income:.2f}", C.GREEN))
+        screen.print(color(f"Total Expenses: ₱{total_expense:.2f}", C.RED))
         bal_color = C.GREEN if balance >= 0 else C.RED
-        print(color(f"Total Balance: ₱{balance:.2f}", bal_color, C.BOLD))
-        print()
-        input("Press Enter to return to main menu...")
+        screen.print(color(f"Total Balance: ₱{balance:.2f}", bal_color, C.BOLD))
+        screen.print()
+        screen.input("Press Enter to return to main menu...")
         return
     elif filter_choice == "6":
         clear_terminal()
-        date = input("Enter date (YYYY-MM-DD): ").strip()
+        date = screen.input("Enter date (YYYY-MM-DD): ").strip()
         try:
             datetime.strptime(date, "%Y-%m-%d")
-            filtered = [t for t in transactions if t["date"] == date]
+            filtered = find_transactions(data, username, date=date)
             clear_terminal()
-            print(color(f"---------------- Transactions for {date} ----------------", C.WHITE, C.BOLD))
+            screen.print(color(f"---------------- Transactions for {date} ----------------", C.WHITE, C.BOLD))
             # Summary total in white at the top
-            date_total_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-            date_total_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
+            sums = filtered_totals(data, username, date=date)
+            date_total_income = sums["Income"]
+            date_total_expense = sums["Expense"]
             date_balance = date_total_income - date_total_expense
-            print(color(f"Total Income: ₱{date_total_income:.2f} | Total Expenses: ₱{date_total_expense:.2f} | Savings: ₱{date_balance:.2f}", C.WHITE))
+            screen.print(color(f"Total Income: ₱{date_total_income:.2f} | Total Expenses: ₱{date_total_expense:.2f} | Savings: ₱{date_balance:.2f}", C.WHITE))
             # Display transactions
             for t in filtered:
-                print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
-            # Calculate and display summary
-            total_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-            total_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
+                screen.print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
+            # Display summary
+            total_income = date_total_income
+            total_expense = date_total_expense
             balance = total_income - total_expense
-            print()
-            print(color("---------------- Summary ----------------", C.BOLD))
-            print(color(f"Total Income: ₱{total_income:.2f}", C.GREEN))
-            print(color(f"Total Expenses: ₱{total_expense:.2f}", C.RED))
+            screen.print()
+            screen.print(color("---------------- Summary ----------------", C.BOLD))
+            screen.print(color(f"Total Income: ₱{total_income:.2f}", C.GREEN))
+            screen.print(color(f"Total Expenses: ₱{total_expense:.2f}", C.RED))
             bal_color = C.GREEN if balance >= 0 else C.RED
-            print(color(f"Total Savings: ₱{balance:.2f}", C.YELLOW))
-            print()
-            input("Press Enter to return to main menu...")
+            screen.print(color(f"Total Savings: ₱{balance:.2f}", C.YELLOW))
+            screen.print()
+            screen.input("Press Enter to return to main menu...")
             return
         except ValueError:
-            print(color("❌ Invalid date format. Use YYYY-MM-DD.", C.RED))
-            input("Press Enter to continue...")
+            screen.print(color("❌ Invalid date format. Use YYYY-MM-DD.", C.RED))
+            screen.input("Press Enter to continue...")
             return
 
 
-    elif filter_choice != "1":
-        print("❌ Invalid choice.")
-        input("Press Enter to continue...")
+    elif filter_choice == "7":
+        clear_terminal()
+        screen.print(color("Custom Filter", C.BOLD))
+        screen.print(color("Combine conditions on date, type, category, amount, description and id with and/or/not, e.g.", C.DIM))
+        screen.print(color('  category = Transportation and amount > 100 and date >= today-3m', C.DIM))
+        screen.print(color('  category in ("Food & Groceries", Bills) or description ~ coffee', C.DIM))
+        screen.print(color("Operators: = != < <= > >= in (...) between ... and ... ~ (contains). Dates: YYYY-MM-DD, today, yesterday, today-7d/4w/3m/1y.", C.DIM))
+        screen.print()
+        expression = screen.input("Filter: ").strip()
+        try:
+            filtered = query_transactions(data, username, expression)
+        except ValueError as error:
+            screen.print(color(f"❌ Invalid filter: {error}", C.RED))
+            screen.input("Press Enter to continue...")
+            return
+        sums = aggregate(filtered)["types"]
+        header = [color(f"---------------- {expression} ({len(filtered)} found) ----------------", C.WHITE, C.BOLD),
+                  *summary_lines(sums["Income"], sums["Expense"])]
+        page_transactions(header, iter(filtered), len(filtered))
+        return
+    elif filter_choice == "8":
+        clear_terminal()
+        screen.print(color("Search Descriptions", C.BOLD))
+        screen.print(color("Every word must start a word of the description, e.g. \"groc jan\" finds \"Groceries for January\".", C.DIM))
+        screen.print()
+        text = screen.input("Search: ").strip()
+        started = time.perf_counter()
+        filtered = search_transactions(data, username, text)
+        elapsed = (time.perf_counter() - started) * 1000
+        sums = aggregate(filtered)["types"]
+        header = [color(f"---------------- {text} ({len(filtered)} found in {elapsed:.1f} ms) ----------------", C.WHITE, C.BOLD),
+                  *summary_lines(sums["Income"], sums["Expense"])]
+        page_transactions(header, iter(filtered), len(filtered))
+        return
+    elif filter_choice == "1":
+        summary = type_totals(data, username)
+        header = summary_lines(summary["Income"], summary["Expense"])
+        page_transactions(header, iter_transactions(data, username), count_transactions(data, username))
+        return
+    else:
+        screen.print("❌ Invalid choice.")
+        screen.input("Press Enter to continue...")
         return
 
-    if not filtered:
-        print("No transactions match the filter.")
-        input("Press Enter to return to main menu...")
+    if filter_choice == "3" and group_choice in ("1", "2") and not filtered:
+        screen.print("No transactions match the filter.")
+        screen.input("Press Enter to return to main menu...")
         return
 
     # Calculate summary
-    total_income = sum(t["amount"] for t in filtered if t["type"] == "Income")
-    total_expense = sum(t["amount"] for t in filtered if t["type"] == "Expense")
+    total_income = summary["Income"]
+    total_expense = summary["Expense"]
     balance = total_income - total_expense
     # Display summary
-    print(color("\n---------------- Summary ----------------", C.BOLD))
-    print(color(f"Total Income: ₱{total_income:.2f}", C.GREEN))
-    print(color(f"Total Expenses: ₱{total_expense:.2f}", C.RED))
+    screen.print(color("\n---------------- Summary ----------------", C.BOLD))
+    screen.print(color(f"Total Income: ₱{total_income:.2f}", C.GREEN))
+    screen.print(color(f"Total Expenses: ₱{total_expense:.2f}", C.RED))
     bal_color = C.GREEN if balance >= 0 else C.RED
-    print(color(f"Total Balance: ₱{balance:.2f}", bal_color, C.BOLD))
-    print()
-
-    if filter_choice == "3":
-        # For date filter, display grouped as before, but summary is overall
-        pass  # Already handled above
-    elif filter_choice in ["1", "2"]:
-        # Display transactions for all and category filters
-        for t in filtered:
-            print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.DIM))
+    screen.print(color(f"Total Balance: ₱{balance:.2f}", bal_color, C.BOLD))
+    screen.print()
 
-    input("\nPress Enter to return to main menu...")
+    screen.input("\nPress Enter to return to main menu...")
 
 def delete_record(data, username):
     while True:
         clear_terminal()
-        print(color("Delete Record", C.BOLD))
-        print(color("----------------", C.BOLD))
-        print(color("Delete an existing transaction record.", C.DIM))
-        print()
+        screen.print(color("Delete Record", C.BOLD))
+        screen.print(color("----------------", C.BOLD))
+        screen.print(color("Delete an existing transaction record.", C.DIM))
+        screen.print()
 
 
 
-        confirm = input("Do you really want to delete a record? (y/n): ").lower()
+        confirm = screen.input("Do you really want to delete a record? (y/n): ").lower()
         if confirm != "y":
-            print("Returning to main menu...")
-            input("Press Enter to continue...")
+            screen.print("Returning to main menu...")
+            screen.input("Press Enter to continue...")
             return
         clear_terminal()
 
         clear_terminal()
-        transactions = data["transactions"][username]
-        if not transactions:
-            print("No transactions found.")
-            input("Press Enter to continue...")
+        if not count_transactions(data, username):
+            screen.print("No transactions found.")
+            screen.input("Press Enter to continue...")
             return
 
-        print(color("Delete options:", C.BOLD))
-        print("1. Delete by date")
-        print("2. Delete by transaction ID")
-        print("3. Delete all records")
-        delete_choice = input("Choose (1-3): ").strip()
+        screen.print(color("Delete options:", C.BOLD))
+        screen.print("1. Delete by date")
+        screen.print("2. Delete by transaction ID")
+        screen.print("3. Delete all records")
+        delete_choice = screen.input("Choose (1-3): ").strip()
 
         if delete_choice == "1":
             clear_terminal()
-            print(color("Delete by Date", C.BOLD))
-            print(color("Enter the date to delete all records for that date.", C.DIM))
-            print()
-            use_today = input("Use today's date? (y/n): ").lower().strip()
+            screen.print(color("Delete by Date", C.BOLD))
+            screen.print(color("Enter the date to delete all records for that date.", C.DIM))
+            screen.print()
+            use_today = screen.input("Use today's date? (y/n): ").lower().strip()
             if use_today == "y":
                 date = datetime.now().strftime("%Y-%m-%d")
             elif use_today == "n":
-                date = input("Enter date (YYYY-MM-DD): ").strip()
+                date = screen.input("Enter date (YYYY-MM-DD): ").strip()
                 if not date:
-                    print("❌ Date cannot be empty.")
-                    input("Press Enter to continue...")
+                    screen.print("❌ Date cannot be empty.")
+                    screen.input("Press Enter to continue...")
                     continue
                 try:
                     datetime.strptime(date, "%Y-%m-%d")
                 except ValueError:
-                    print("❌ Invalid date format. Use YYYY-MM-DD.")
-                    input("Press Enter to continue...")
+                    screen.print("❌ Invalid date format. Use YYYY-MM-DD.")
+                    screen.input("Press Enter to continue...")
                     continue
             else:
-                print("❌ Please enter 'y' or 'n'.")
-                input("Press Enter to continue...")
+                screen.print("❌ Please enter 'y' or 'n'.")
+                screen.input("Press Enter to continue...")
                 continue
 
-            filtered = [t for t in transactions if t["date"] == date]
+            filtered = find_transactions(data, username, date=date)
             if not filtered:
-                print(f"No transactions found for {date}.")
-                input("Press Enter to continue...")
+                screen.print(f"No transactions found for {date}.")
+                screen.input("Press Enter to continue...")
                 continue
 
-            print(color(f"\nTransactions for {date}:", C.BOLD))
+            screen.print(color(f"\nTransactions for {date}:", C.BOLD))
             for t in filtered:
-                print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.GRAY))
+                screen.print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.GRAY))
 
-            confirm = input(f"\nDelete all {len(filtered)} record(s) for {date}? (y/n): ").lower().strip()
+            confirm = screen.input(f"\nDelete all {len(filtered)} record(s) for {date}? (y/n): ").lower().strip()
             if confirm == "y":
-                confirm2 = input("Are you sure? This action cannot be undone. (type 'YES' to confirm): ").strip()
+                confirm2 = screen.input("Are you sure? This action cannot be undone. (type 'YES' to confirm): ").strip()
                 if confirm2 == "YES":
-                    data["transactions"][username] = [t for t in transactions if t["date"] != date]
-                    save_data(data)
-                    print(color("✅ Records deleted successfully!", C.GREEN, C.BOLD))
+                    commit_change(data, {"op": "delete", "user": username, "ids": [t["id"] for t in filtered]})
+                    screen.print(color("✅ Records deleted successfully!", C.GREEN, C.BOLD))
                 else:
-                    print("Deletion cancelled.")
+                    screen.print("Deletion cancelled.")
             else:
-                print("Deletion cancelled.")
+                screen.print("Deletion cancelled.")
         elif delete_choice == "2":
             clear_terminal()
-            print(color("Delete by ID", C.BOLD))
-            print(color("Enter the transaction ID to delete.", C.DIM))
-            print()
-            tid_input = input("Enter transaction ID: ").strip()
+            screen.print(color("Delete by ID", C.BOLD))
+            screen.print(color("Enter the transaction ID to delete.", C.DIM))
+            screen.print()
+            tid_input = screen.input("Enter transaction ID: ").strip()
             if not tid_input:
-                print("❌ ID cannot be empty.")
-                input("Press Enter to continue...")
+                screen.print("❌ ID cannot be empty.")
+                screen.input("Press Enter to continue...")
                 continue
             try:
                 tid = int(tid_input)
             except ValueError:
-                print("❌ Invalid ID. Must be a number.")
-                input("Press Enter to continue...")
+                screen.print("❌ Invalid ID. Must be a number.")
+                screen.input("Press Enter to continue...")
                 continue
 
-            transaction = next((t for t in transactions if t["id"] == tid), None)
+            transaction = get_transaction(data, username, tid)
             if not transaction:
-                print("Transaction not found.")
-                input("Press Enter to continue...")
+                screen.print("Transaction not found.")
+                screen.input("Press Enter to continue...")
                 continue
 
-            print(color("Transaction to delete:", C.BOLD))
-            print(color(f"[{transaction['id']}] {transaction['date']} | {transaction['type']} | ₱{transaction['amount']:.2f} | {transaction['category']} | {transaction['description']}", C.GRAY))
+            screen.print(color("Transaction to delete:", C.BOLD))
+            screen.print(color(f"[{transaction['id']}] {transaction['date']} | {transaction['type']} | ₱{transaction['amount']:.2f} | {transaction['category']} | {transaction['description']}", C.GRAY))
 
-            confirm = input("Delete this record? (y/n): ").lower().strip()
+            confirm = screen.input("Delete this record? (y/n): ").lower().strip()
             if confirm == "y":
-                confirm2 = input("Are you sure? This action cannot be undone. (type 'YES' to confirm): ").strip()
+                confirm2 = screen.input("Are you sure? This action cannot be undone. (type 'YES' to confirm): ").strip()
                 if confirm2 == "YES":
-                    data["transactions"][username] = [t for t in transactions if t["id"] != tid]
-                    save_data(data)
-                    print(color("✅ Record deleted successfully!", C.GREEN, C.BOLD))
+                    commit_change(data, {"op": "delete", "user": username, "ids": [tid]})
+                    screen.print(color("✅ Record deleted successfully!", C.GREEN, C.BOLD))
                 else:
-                    print("Deletion cancelled.")
+                    screen.print("Deletion cancelled.")
             else:
-                print("Deletion cancelled.")
+                screen.print("Deletion cancelled.")
         elif delete_choice == "3":
             clear_terminal()
-            print(color("Delete All Records", C.BOLD))
-            print(color("⚠️  WARNING: This will permanently delete ALL your transaction records!", C.RED, C.BOLD))
-            print(color("This action cannot be undone.", C.RED))
-            print()
-            total_records = len(transactions)
+            screen.print(color("Delete All Records", C.BOLD))
+            screen.print(color("⚠️  WARNING: This will permanently delete ALL your transaction records!", C.RED, C.BOLD))
+            screen.print(color("This action cannot be undone.", C.RED))
+            screen.print()
+            total_records = count_transactions(data, username)
             if total_records == 0:
-                print("No records to delete.")
-                input("Press Enter to continue...")
+                screen.print("No records to delete.")
+                screen.input("Press Enter to continue...")
                 continue
-            print(color(f"You have {total_records} transaction(s) that will be deleted.", C.YELLOW))
-            print()
-            confirm1 = input("Are you absolutely sure you want to delete ALL records? (type 'YES' to confirm): ").strip()
+            screen.print(color(f"You have {total_records} transaction(s) that will be deleted.", C.YELLOW))
+            screen.print()
+            confirm1 = screen.input("Are you absolutely sure you want to delete ALL records? (type 'YES' to confirm): ").strip()
             if confirm1 == "YES":
-                confirm2 = input("This is your final confirmation. Type 'DELETE ALL' to proceed: ").strip()
+                confirm2 = screen.input("This is your final confirmation. Type 'DELETE ALL' to proceed: ").strip()
                 if confirm2 == "DELETE ALL":
-                    confirm3 = input("Last chance! Type 'CONFIRM DELETE ALL' to permanently delete everything: ").strip()
+                    confirm3 = screen.input("Last chance! Type 'CONFIRM DELETE ALL' to permanently delete everything: ").strip()
                     if confirm3 == "CONFIRM DELETE ALL":
-                        data["transactions"][username] = []
-                        save_data(data)
-                        print(color("✅ All records deleted successfully!", C.GREEN, C.BOLD))
+                        commit_change(data, {"op": "clear", "user": username})
+                        screen.print(color("✅ All records deleted successfully!", C.GREEN, C.BOLD))
                     else:
-                        print("Deletion cancelled.")
+                        screen.print("Deletion cancelled.")
                 else:
-                    print("Deletion cancelled.")
+                    screen.print("Deletion cancelled.")
             else:
-                print("Deletion cancelled.")
+                screen.print("Deletion cancelled.")
         else:
-            print(color("❌ Invalid choice.", C.RED))
-            input("Press Enter to continue...")
+            screen.print(color("❌ Invalid choice.", C.RED))
+            screen.input("Press Enter to continue...")
             continue
 
-        print()
-        delete_another = input("Delete another record? (y/n) or press Enter to exit: ").lower().strip()
+        screen.print()
+        delete_another = screen.input("Delete another record? (y/n) or press Enter to exit: ").lower().strip()
         if delete_another == "y":
             clear_terminal()
         else:
             break
-    input("Press Enter to return to main menu...")
+    screen.input("Press Enter to return to main menu...")
 
 def edit_record(data, username):
     while True:
         clear_terminal()
-        print(color("Edit Record", C.BOLD))
-        print(color("----------------", C.BOLD))
-        print(color("Edit an existing transaction record.", C.DIM))
-        print()
+        screen.print(color("Edit Record", C.BOLD))
+        screen.print(color("----------------", C.BOLD))
+        screen.print(color("Edit an existing transaction record.", C.DIM))
+        screen.print()
 
 
 
-        confirm = input("Do you really want to edit a record? (y/n): ").lower()
+        confirm = screen.input("Do you really want to edit a record? (y/n): ").lower()
         if confirm != "y":
-            print("Returning to main menu...")
-            input("Press Enter to continue...")
+            screen.print("Returning to main menu...")
+            screen.input("Press Enter to continue...")
             return
         clear_terminal()
 
         clear_terminal()
-        transactions = data["transactions"][username]
-        if not transactions:
-            print("No transactions found.")
-            input("Press Enter to continue...")
+        if not count_transactions(data, username):
+            screen.print("No transactions found.")
+            screen.input("Press Enter to continue...")
             return
 
-        use_today = input("Use today's date? (y/n): ").lower().strip()
+        use_today = screen.input("Use today's date? (y/n): ").lower().strip()
         if use_today == "y":
             today = datetime.now().strftime("%Y-%m-%d")
             year, month, day = today.split("-")
         elif use_today == "n":
-            print(color("Date format: YYYY-MM-DD", C.BOLD))
-            date_input = input("Enter date (YYYY-MM-DD): ").strip()
+            screen.print(color("Date format: YYYY-MM-DD", C.BOLD))
+            date_input = screen.input("Enter date (YYYY-MM-DD): ").strip()
             if not date_input:
-                print("❌ Date cannot be empty.")
-                input("Press Enter to continue...")
+                screen.print("❌ Date cannot be empty.")
+                screen.input("Press Enter to continue...")
                 continue
             try:
                 datetime.strptime(date_input, "%Y-%m-%d")
                 year, month, day = date_input.split("-")
             except ValueError:
-                print("❌ Invalid date format. Use YYYY-MM-DD.")
-                input("Press Enter to continue...")
+                screen.print("❌ Invalid date format. Use YYYY-MM-DD.")
+                screen.input("Press Enter to continue...")
                 continue
         else:
-            print("❌ Please enter 'y' or 'n'.")
-            input("Press Enter to continue...")
+            screen.print("❌ Please enter 'y' or 'n'.")
+            screen.input("Press Enter to continue...")
             continue
 
-        filtered = [t for t in transactions if t["date"].startswith(f"{year}-{month}-{day}")]
+        filtered = find_transactions(data, username, date=f"{year}-{month}-{day}")
         if not filtered:
-            print("No transactions found for that date.")
-            input("Press Enter to continue...")
+            screen.print("No transactions found for that date.")
+            screen.input("Press Enter to continue...")
             continue
 
-        print(color(f"\n--------------- {year}-{month}-{day} ---------------", C.BOLD))
+        screen.print(color(f"\n--------------- {year}-{month}-{day} ---------------", C.BOLD))
         for t in filtered:
-            print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.GRAY))
+            screen.print(color(f"[{t['id']}] {t['date']} | {t['type']} | ₱{t['amount']:.2f} | {t['category']} | {t['description']}", C.GRAY))
 
-        tid_input = input("\nEnter transaction ID to edit: ").strip()
+        tid_input = screen.input("\nEnter transaction ID to edit: ").strip()
         if not tid_input:
-            print("❌ ID cannot be empty.")
-            input("Press Enter to continue...")
+            screen.print("❌ ID cannot be empty.")
+            screen.input("Press Enter to continue...")
             continue
         try:
             tid = int(tid_input)
         except ValueError:
-            print("❌ Invalid ID. Must be a number.")
-            input("Press Enter to continue...")
+            screen.print("❌ Invalid ID. Must be a number.")
+            screen.input("Press Enter to continue...")
             continue
 
-        transaction = next((t for t in transactions if t["id"] == tid), None)
+        transaction = get_transaction(data, username, tid)
         if not transaction:
-            print("Transaction not found.")
-            input("Press Enter to continue...")
+            screen.print("Transaction not found.")
+            screen.input("Press Enter to continue...")
             continue
 
-        print(color("\nWhat do you want to edit?", C.BOLD))
-        print("1. Type\n2. Amount\n3. Category\n4. Description\n5. Date")
-        choice = input("Choose between the options: ").strip()
+        # Edits are collected here and only applied once the user confirms
+        changes = {}
+        screen.print(color("\nWhat do you want to edit?", C.BOLD))
+        screen.print("1. Type\n2. Amount\n3. Category\n4. Description\n5. Date")
+        choice = screen.input("Choose between the options: ").strip()
 
         if choice == "1":
             while True:
                 clear_terminal()
-                print(color("\nSelect new type:", C.BOLD))
-                print("1. Expense")
-                print("2. Income")
-                new_choice = input("Choose (1 or 2): ").strip()
+                screen.print(color("\nSelect new type:", C.BOLD))
+                screen.print("1. Expense")
+                screen.print("2. Income")
+                new_choice = screen.input("Choose (1 or 2): ").strip()
                 if new_choice == "1":
-                    transaction["type"] = "Expense"
+                    changes["type"] = "Expense"
                     break
                 elif new_choice == "2":
-                    transaction["type"] = "Income"
+                    changes["type"] = "Income"
                     break
                 else:
-                    print("❌ Invalid choice. Enter 1 or 2.")
+                    screen.print("❌ Invalid choice. Enter 1 or 2.")
         elif choice == "2":
             while True:
                 clear_terminal()
-                amount_input = input(color("New amount: ", C.BOLD)).strip()
+                amount_input = screen.input(color("New amount: ", C.BOLD)).strip()
                 if not amount_input:
-                    print("❌ Amount cannot be empty.")
+                    screen.print("❌ Amount cannot be empty.")
                     continue
                 try:
                     new_amount = float(amount_input)
+                    if not math.isfinite(new_amount):
+                        raise ValueError(amount_input)  # "inf" and "nan" parse as floats
                     if new_amount <= 0:
-                        print("❌ Amount must be positive.")
+                        screen.print("❌ Amount must be positive.")
                         continue
-                    transaction["amount"] = new_amount
+                    changes["amount"] = new_amount
                     break
                 except ValueError:
-                    print("❌ Invalid amount. Enter a number.")
+                    screen.print("❌ Invalid amount. Enter a number.")
 
         elif choice == "3":
             # Edit category based on current type
             clear_terminal()
             if transaction["type"] == "Expense":
-                expense_categories = ["Food & Groceries", "Transportation", "Entertainment", "Personal Needs", "Personal Wants", "Health & Fitness", "Bills", "School/Work"]
-                print(color("Select new expense category:", C.BOLD))
+                expense_categories = EXPENSE_CATEGORIES
+                screen.print(color("Select new expense category:", C.BOLD))
                 for i, cat in enumerate(expense_categories, 1):
-                    print(f"{i}. {cat}")
+                    screen.print(f"{i}. {cat}")
                 while True:
-                    cat_choice = input("Choose (1-8): ").strip()
+                    cat_choice = screen.input("Choose (1-8): ").strip()
                     if cat_choice.isdigit() and 1 <= int(cat_choice) <= 8:
-                        transaction["category"] = expense_categories[int(cat_choice) - 1]
+                        changes["category"] = expense_categories[int(cat_choice) - 1]
                         break
                     else:
-                        print("❌ Invalid choice. Enter 1-8.")
+                        screen.print("❌ Invalid choice. Enter 1-8.")
             else:  # Income
-                income_categories = ["Allowance", "Work", "Reward", "Gift"]
-                print(color("Select new income category:", C.BOLD))
+                income_categories = INCOME_CATEGORIES
+                screen.print(color("Select new income category:", C.BOLD))
                 for i, cat in enumerate(income_categories, 1):
-                    print(f"{i}. {cat}")
+                    screen.print(f"{i}. {cat}")
                 while True:
-                    cat_choice = input("Choose (1-4): ").strip()
+                    cat_choice = screen.input("Choose (1-4): ").strip()
                     if cat_choice.isdigit() and 1 <= int(cat_choice) <= 4:
-                        transaction["category"] = income_categories[int(cat_choice) - 1]
+                        changes["category"] = income_categories[int(cat_choice) - 1]
                         break
                     else:
-                        print("❌ Invalid choice. Enter 1-4.")
+                        screen.print("❌ Invalid choice. Enter 1-4.")
         elif choice == "4":
             clear_terminal()
-            transaction["description"] = input(color("New description: ", C.BOLD)).strip()
+            changes["description"] = screen.input(color("New description: ", C.BOLD)).strip()
         elif choice == "5":
             clear_terminal()
-            print(color("New Date format: YYYY-MM-DD", C.BOLD))
-            use_today = input("Use today's date? (y/n): ").lower().strip()
+            screen.print(color("New Date format: YYYY-MM-DD", C.BOLD))
+            use_today = screen.input("Use today's date? (y/n): ").lower().strip()
             if use_today == "y":
                 new_date = datetime.now().strftime("%Y-%m-%d")
             elif use_today == "n":
-                new_date = input("Enter date (YYYY-MM-DD): ").strip()
+                new_date = screen.input("Enter date (YYYY-MM-DD): ").strip()
                 if not new_date:
-                    print("❌ Date cannot be empty.")
+                    screen.print("❌ Date cannot be empty.")
                     continue
                 try:
                     datetime.strptime(new_date, "%Y-%m-%d")
                 except ValueError:
-                    print("❌ Invalid date format. Use YYYY-MM-DD.")
+                    screen.print("❌ Invalid date format. Use YYYY-MM-DD.")
                     continue
             else:
-                print("❌ Please enter 'y' or 'n'.")
+                screen.print("❌ Please enter 'y' or 'n'.")
                 continue
-            transaction["date"] = new_date
+            changes["date"] = new_date
         else:
-            print("Invalid choice.")
-            input("Press Enter to continue...")
+            screen.print("Invalid choice.")
+            screen.input("Press Enter to continue...")
             continue
 
-        print(color("\nUpdated record preview:", C.BOLD))
-        print(color(f"[{transaction['id']}] {transaction['date']} | {transaction['type']} | ₱{transaction['amount']:.2f} | {transaction['category']} | {transaction['description']}", C.CYAN))
+        preview = dict(transaction, **changes)
+        screen.print(color("\nUpdated record preview:", C.BOLD))
+        screen.print(color(f"[{preview['id']}] {preview['date']} | {preview['type']} | ₱{preview['amount']:.2f} | {preview['category']} | {preview['description']}", C.CYAN))
 
-        confirm = input("Save changes? (y/n): ").lower().strip()
+        confirm = screen.input("Save changes? (y/n): ").lower().strip()
         if confirm == "y":
-            save_data(data)
-            print(color("✅ Record updated successfully!", C.GREEN, C.BOLD))
+            commit_change(data, {"op": "edit", "user": username, "id": tid, "changes": changes})
+            screen.print(color("✅ Record updated successfully!", C.GREEN, C.BOLD))
         else:
-            print("Changes discarded.")
+            screen.print("Changes discarded.")
 
-        print()
-        edit_another = input("Edit another record? (y/n) or press Enter to exit: ").lower().strip()
+        screen.print()
+        edit_another = screen.input("Edit another record? (y/n) or press Enter to exit: ").lower().strip()
         if edit_another == "y":
             clear_terminal()
         else:
             break
-    input("Press Enter to return to main menu...")
+    screen.input("Press Enter to return to main menu...")
+
+def import_records(data, username):
+    clear_terminal()
+    screen.print(color("Import Records", C.BOLD))
+    screen.print(color("----------------", C.BOLD))
+    screen.print(color("Import expense and income records from a CSV file.", C.DIM))
+    screen.print()
+    screen.print(color(f"Expected columns: {', '.join(IMPORT_COLUMNS.values())} (dates as YYYY-MM-DD)", C.DIM))
+    screen.print()
+
+    path = screen.input("Enter CSV file path (or press Enter to cancel): ").strip()
+    if not path:
+        screen.print("Returning to main menu...")
+        screen.input("Press Enter to continue...")
+        return
+    if not os.path.isfile(path):
+        screen.print(color("❌ File not found.", C.RED))
+        screen.input("Press Enter to continue...")
+        return
+
+    try:
+        added, duplicates, rejected = import_csv(data, username, path)
+    except (OSError, UnicodeDecodeError, csv.Error) as error:
+        screen.print(color(f"❌ Could not read the file: {error}", C.RED))
+        screen.input("Press Enter to continue...")
+        return
+
+    screen.print(color(f"✅ Imported {added} record(s).", C.GREEN, C.BOLD))
+    if duplicates:
+        screen.print(color(f"Skipped {duplicates} record(s) already in your history.", C.YELLOW))
+    if rejected:
+        screen.print(color(f"Skipped {len(rejected)} invalid row(s):", C.RED))
+        for line, reason in rejected[:10]:
+            screen.print(color(f"  Line {line}: {reason}", C.DIM))
+        if len(rejected) > 10:
+            screen.print(color(f"  ...and {len(rejected) - 10} more.", C.DIM))
+    screen.input("Press Enter to return to main menu...")
+
+def export_records(data, username):
+    clear_terminal()
+    screen.print(color("Export Records", C.BOLD))
+    screen.print(color("----------------", C.BOLD))
+    screen.print(color("Save your transactions or summaries to a CSV or JSON Lines file.", C.DIM))
+    screen.print()
+
+    if not count_transactions(data, username):
+        screen.print("No transactions found.")
+        screen.input("Press Enter to return to main menu...")
+        return
+
+    screen.print(color("What to export:", C.BOLD))
+    screen.print("1. All transactions")
+    screen.print("2. By category")
+    screen.print("3. By type (Expense/Income)")
+    screen.print("4. By date range")
+    screen.print("5. By specific date")
+    screen.print("6. Recent transactions")
+    screen.print("7. Summary by day/week/month/quarter/year")
+    export_choice = screen.input("Choose (1-7): ").strip()
+
+    filters = {}
+    kind = None
+    if export_choice == "1":
+        pass
+    elif export_choice in ("2", "3"):
+        type_choice = screen.input("Type - 1. Expense, 2. Income: ").strip()
+        if type_choice not in ("1", "2"):
+            screen.print(color("❌ Invalid choice.", C.RED))
+            screen.input("Press Enter to continue...")
+            return
+        filters["type_"] = "Expense" if type_choice == "1" else "Income"
+        if export_choice == "2":
+            categories = CATEGORIES[filters["type_"]]
+            for i, cat in enumerate(categories, 1):
+                screen.print(f"{i}. {cat}")
+            cat_choice = screen.input(f"Choose (1-{len(categories)}): ").strip()
+            if not (cat_choice.isdigit() and 1 <= int(cat_choice) <= len(categories)):
+                screen.print(color("❌ Invalid choice.", C.RED))
+                screen.input("Press Enter to continue...")
+                return
+            filters["category"] = categories[int(cat_choice) - 1]
+    elif export_choice in ("4", "5", "7"):
+        if export_choice == "7":
+            kinds = ["day", "week", "month", "quarter", "year"]
+            kind_choice = screen.input("Group by - 1. Day, 2. Week, 3. Month, 4. Quarter, 5. Year: ").strip()
+            if not (kind_choice.isdigit() and 1 <= int(kind_choice) <= len(kinds)):
+                screen.print(color("❌ Invalid choice.", C.RED))
+                screen.input("Press Enter to continue...")
+                return
+            kind = kinds[int(kind_choice) - 1]
+        prompts = [("date", "Enter date (YYYY-MM-DD): ")] if export_choice == "5" else \
+                  [("start", "From date (YYYY-MM-DD, Enter for no limit): "), ("end", "To date (YYYY-MM-DD, Enter for no limit): ")]
+        for key, prompt in prompts:
+            value = screen.input(prompt).strip()
+            if not value and key != "date":
+                continue
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                screen.print(color("❌ Invalid date format. Use YYYY-MM-DD.", C.RED))
+                screen.input("Press Enter to continue...")
+                return
+            filters[key] = value
+    elif export_choice == "6":
+        num_input = screen.input("How many recent transactions? ").strip()
+        if not num_input.isdigit() or int(num_input) <= 0:
+            screen.print(color("❌ Number must be a positive integer.", C.RED))
+            screen.input("Press Enter to continue...")
+            return
+        filters["recent"] = int(num_input)
+    else:
+        screen.print(color("❌ Invalid choice.", C.RED))
+        screen.input("Press Enter to continue...")
+        return
+
+    format_choice = screen.input("Format - 1. CSV, 2. JSON Lines: ").strip()
+    if format_choice not in ("1", "2"):
+        screen.print(color("❌ Invalid choice.", C.RED))
+        screen.input("Press Enter to continue...")
+        return
+    fmt = EXPORT_FORMATS[int(format_choice) - 1]
+    default_path = f"{username}-{kind or 'transactions'}.{fmt}"
+    path = screen.input(f"Save to (Enter for {default_path}): ").strip() or default_path
+
+    try:
+        if kind:
+            written = export_summary(data, username, path, kind, fmt, **filters)
+        else:
+            written = export_transactions(data, username, path, fmt, **filters)
+    except OSError as error:
+        screen.print(color(f"❌ Could not write the file: {error}", C.RED))
+        screen.input("Press Enter to continue...")
+        return
+    screen.print(color(f"✅ Exported {written} row(s) to {path}.", C.GREEN, C.BOLD))
+    screen.input("Press Enter to return to main menu...")
 
 def dashboard(data, username):
     while True:
         clear_terminal()
-        transactions = data["transactions"][username]
-        total_income = sum(t["amount"] for t in transactions if t["type"] == "Income")
-        total_expense = sum(t["amount"] for t in transactions if t["type"] == "Expense")
+        totals = type_totals(data, username)
+        total_income = totals["Income"]
+        total_expense = totals["Expense"]
         balance = total_income - total_expense
         total_savings = balance
 
@@ -1161,28 +3783,17 @@ def dashboard(data, username):
         today_str = today.strftime("%Y-%m-%d")
 
         # Calculate summaries by category
-        income_summary = {}
-        expense_summary = {}
-        for t in transactions:
-            if t["type"] == "Income":
-                income_summary[t["category"]] = income_summary.get(t["category"], 0) + t["amount"]
-            elif t["type"] == "Expense":
-                expense_summary[t["category"]] = expense_summary.get(t["category"], 0) + t["amount"]
+        income_summary = category_totals(data, username, "Income")
+        expense_summary = category_totals(data, username, "Expense")
 
-        today_income_summary = {}
-        today_expense_summary = {}
-        for t in transactions:
-            if t["date"] == today_str:
-                if t["type"] == "Income":
-                    today_income_summary[t["category"]] = today_income_summary.get(t["category"], 0) + t["amount"]
-                elif t["type"] == "Expense":
-                    today_expense_summary[t["category"]] = today_expense_summary.get(t["category"], 0) + t["amount"]
+        today_income_summary = category_totals(data, username, "Income", date=today_str)
+        today_expense_summary = category_totals(data, username, "Expense", date=today_str)
 
-        print(color("Dashboard", C.BOLD))
-        print(color("----------------", C.BOLD))
-        print(color(f"Hello, {username}! Welcome!", C.DIM))
-        print(color("Your financial dashboard.\nSummarizes your Money flow!", C.DIM))
-        print()
+        screen.print(color("Dashboard", C.BOLD))
+        screen.print(color("----------------", C.BOLD))
+        screen.print(color(f"Hello, {username}! Welcome!", C.DIM))
+        screen.print(color("Your financial dashboard.\nSummarizes your Money flow!", C.DIM))
+        screen.print()
 
 
 
@@ -1191,10 +3802,13 @@ def dashboard(data, username):
         yesterday = today - timedelta(days=1)
         today_str = today.strftime("%Y-%m-%d")
         yesterday_str = yesterday.strftime("%Y-%m-%d")
-        today_expense = sum(t["amount"] for t in transactions if t["type"] == "Expense" and t["date"] == today_str)
-        yesterday_expense = sum(t["amount"] for t in transactions if t["type"] == "Expense" and t["date"] == yesterday_str)
-        today_income = sum(t["amount"] for t in transactions if t["type"] == "Income" and t["date"] == today_str)
-        yesterday_income = sum(t["amount"] for t in transactions if t["type"] == "Income" and t["date"] == yesterday_str)
+        # Per-day totals for today and the week before it, in one query
+        days = daily_totals(data, username, start=(today - timedelta(days=7)).strftime("%Y-%m-%d"), end=today_str)
+        no_totals = {"Income": 0, "Expense": 0}
+        today_expense = days.get(today_str, no_totals)["Expense"]
+        yesterday_expense = days.get(yesterday_str, no_totals)["Expense"]
+        today_income = days.get(today_str, no_totals)["Income"]
+        yesterday_income = days.get(yesterday_str, no_totals)["Income"]
         today_savings = today_income - today_expense
         yesterday_savings = yesterday_income - yesterday_expense
         has_today_data = today_expense > 0 or today_income > 0
@@ -1217,7 +3831,7 @@ def dashboard(data, username):
         ]
         # Analytics
         an_lines = [color("-" * 15 + " Analytics " + "-" * 15, C.BOLD)]
-        unique_dates = set(t["date"] for t in transactions)
+        unique_dates = daily_totals(data, username)
         num_days = len(unique_dates) if unique_dates else 1
         avg_expense_per_day = total_expense / num_days if num_days > 0 else 0
         avg_income_per_day = total_income / num_days if num_days > 0 else 0
@@ -1266,8 +3880,8 @@ def dashboard(data, username):
             an_padded = pad_to_display_width(an, analytics_width)
             fs_padded = pad_to_display_width(fs, financial_width)
             line = f"{an_padded}  |  {fs_padded}"
-            print(line)
-        print()
+            screen.print(line)
+        screen.print()
         # Income and Expense Breakdown Sections (side by side)
         ib_lines = []
         if income_summary:
@@ -1304,25 +3918,22 @@ def dashboard(data, username):
             eb = eb_lines[i] if i < len(eb_lines) else ""
             eb_padded = pad_to_display_width(eb, 60)
             ib_padded = pad_to_display_width(ib, 60)
-            print(f"{eb_padded}  |  {ib_padded}")
+            screen.print(f"{eb_padded}  |  {ib_padded}")
 
         # Suggestion Section - Provides personalized financial tips based on user's spending patterns
-        print()
-        print(color("-" * 15 + " Suggestion " + "-" * 15, C.BOLD))
+        screen.print()
+        screen.print(color("-" * 15 + " Suggestion " + "-" * 15, C.BOLD))
 
         # Calculate expense trend over last 7 days for cases with no today data
         # This helps provide tips when daily data is missing
         last_7_days = [today - timedelta(days=i) for i in range(1, 8)]
-        last_7_expenses = [sum(t["amount"] for t in transactions if t["type"] == "Expense" and t["date"] == d.strftime("%Y-%m-%d")) for d in last_7_days]
+        last_7_expenses = [days.get(d.strftime("%Y-%m-%d"), no_totals)["Expense"] for d in last_7_days]
         avg_expense_last_7 = sum(last_7_expenses) / len(last_7_expenses) if last_7_expenses else 0
         expense_trend = yesterday_expense - avg_expense_last_7 if avg_expense_last_7 > 0 else 0
 
         # Find top expense categories for saving tips, prioritizing essentials
         # Essentials are prioritized for better financial guidance
-        expense_categories = {}
-        for t in transactions:
-            if t["type"] == "Expense":
-                expense_categories[t["category"]] = expense_categories.get(t["category"], 0) + t["amount"]
+        expense_categories = expense_summary
 
         essentials = ["Food & Groceries", "Transportation", "School/Work", "Personal Needs", "Bills", "Health & Fitness"]
         desires = ["Entertainment", "Personal Wants"]
@@ -1504,106 +4115,312 @@ def dashboard(data, username):
         # Display tips based on data availability and financial changes
         # Primary tip is always shown, secondary tip is shown for specific scenarios to provide extra guidance
         if not has_today_data and not has_yesterday_data:
-            print(color("No expenses or income recorded for today or yesterday. Start tracking your transactions to get personalized tips!", C.YELLOW))
-            print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
+            screen.print(color("No expenses or income recorded for today or yesterday. Start tracking your transactions to get personalized tips!", C.YELLOW))
+            screen.print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
         elif not has_today_data:
             # Base tip on expense/savings increase or decrease from last 7 days
-            print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
+            screen.print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
             if expense_trend > 0:
                 secondary_tip = random.choice(secondary_tips_trend_increase)
-                print(color(secondary_tip, C.BLUE))
+                screen.print(color(secondary_tip, C.BLUE))
             elif expense_trend < 0:
                 secondary_tip = random.choice(secondary_tips_trend_decrease)
-                print(color(secondary_tip, C.BLUE))
+                screen.print(color(secondary_tip, C.BLUE))
             else:
                 secondary_tip = random.choice(secondary_tips_trend_stable)
-                print(color(secondary_tip, C.BLUE))
+                screen.print(color(secondary_tip, C.BLUE))
         elif not has_yesterday_data:
-            print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
+            screen.print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
         else:
             # Base analysis on yesterday's data to advise today's spending
             if yesterday_expense > 0:
                 if expense_change > 10:
-                    print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
+                    screen.print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
                     if top_essentials:
                         secondary_tip = random.choice(secondary_tips_spend_too_much)
-                        print(color(secondary_tip, C.BLUE))
+                        screen.print(color(secondary_tip, C.BLUE))
                 elif expense_change < -10:
-                    print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
+                    screen.print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
                     secondary_tip = random.choice(secondary_tips_trend_decrease)
-                    print(color(secondary_tip, C.BLUE))
+                    screen.print(color(secondary_tip, C.BLUE))
                 elif savings_change > 20:
-                    print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
+                    screen.print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
                     secondary_tip = random.choice(secondary_tips_saved_too_much)
-                    print(color(secondary_tip, C.BLUE))
+                    screen.print(color(secondary_tip, C.BLUE))
                 elif savings_change < -20:
-                    print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
+                    screen.print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
                     if top_essentials:
                         secondary_tip = random.choice(secondary_tips_spend_too_much)
-                        print(color(secondary_tip, C.BLUE))
+                        screen.print(color(secondary_tip, C.BLUE))
                 else:
-                    print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
+                    screen.print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
                     secondary_tip = random.choice(secondary_tips_trend_stable)
-                    print(color(secondary_tip, C.BLUE))
+                    screen.print(color(secondary_tip, C.BLUE))
             else:
-                print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
+                screen.print(color(selected_suggestion_tip, C.CYAN, C.BOLD))
 
-        print()
+        screen.print()
 
         # Options Section
-        print(color("-" * 15 + " Options " + "-" * 15, C.BOLD))
-        print(color("1. Add Record", C.WHITE))
-        print(color("2. View History", C.WHITE))
-        print(color("3. Edit Record", C.WHITE))
-        print(color("4. Delete Record", C.WHITE))
-        print(color("5. Logout", C.WHITE))
+        screen.print(color("-" * 15 + " Options " + "-" * 15, C.BOLD))
+        screen.print(color("1. Add Record", C.WHITE))
+        screen.print(color("2. View History", C.WHITE))
+        screen.print(color("3. Edit Record", C.WHITE))
+        screen.print(color("4. Delete Record", C.WHITE))
+        screen.print(color("5. Import Records", C.WHITE))
+        screen.print(color("6. Export Records", C.WHITE))
+        screen.print(color("7. Logout", C.WHITE))
 
-        choice = input("Choose an option: ").strip()
+        choice = screen.input("Choose an option: ").strip()
 
         if choice == "1":
             add_record(data, username)
+            flush_changes(data)
         elif choice == "2":
             view_history(data, username)
         elif choice == "3":
             edit_record(data, username)
+            flush_changes(data)
         elif choice == "4":
             delete_record(data, username)
+            flush_changes(data)
         elif choice == "5":
+            import_records(data, username)
+        elif choice == "6":
+            export_records(data, username)
+        elif choice == "7":
+            flush_changes(data)
+            save_search_indexes(data)
             break
         else:
-            print("Invalid choice.")
-            input("Press Enter to continue...")
+            screen.print("Invalid choice.")
+            screen.input("Press Enter to continue...")
+
+# --- Command line ---
+# `python WADSAET.py <command> --user NAME ...` runs one operation without
+# prompts or screen clearing and prints JSON (or CSV/JSON Lines for record
+# listings) to stdout; errors go to stderr with a non-zero exit code. The
+# password comes from --password or the WADSAET_PASSWORD environment
+# variable.
+def cli_login(data, args):
+    username = data["_emails"].get(args.user, args.user) if is_valid_email(args.user) else args.user
+    password = args.password if args.password is not None else os.environ.get("WADSAET_PASSWORD")
+    if username not in data["users"] or password != data["users"][username]["password"]:
+        raise SystemExit("error: invalid username or password")
+    return username
+
+def cli_date(value):
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {value!r}, use YYYY-MM-DD")
+    return value
+
+def cli_amount(value):
+    try:
+        amount = float(value)
+    except ValueError:
+        amount = 0
+    if not math.isfinite(amount) or amount <= 0:
+        raise argparse.ArgumentTypeError(f"invalid amount {value!r}, must be a number greater than 0")
+    return amount
+
+def cli_count(value):
+    if not value.isdigit() or int(value) == 0:
+        raise argparse.ArgumentTypeError(f"invalid count {value!r}, must be a whole number greater than 0")
+    return int(value)
+
+def cli_filters(args):
+    return {key: value for key, value in (("type_", args.type), ("category", args.category), ("date", args.date),
+                                          ("start", args.start), ("end", args.end)) if value is not None}
+
+def print_json(value):
+    print(json.dumps(value, ensure_ascii=False))
+
+def cli_add(data, username, args):
+    category = next((cat for cat in CATEGORIES[args.type] if cat.lower() == args.category.lower()), None)
+    if category is None:
+        raise SystemExit(f"error: unknown {args.type.lower()} category {args.category!r} (choose from {', '.join(CATEGORIES[args.type])})")
+    transaction = {
+        "id": next_transaction_id(data, username),
+        "date": args.date or datetime.now().strftime("%Y-%m-%d"),
+        "type": args.type,
+        "amount": args.amount,
+        "category": category,
+        "description": args.description,
+        "timestamp": datetime.now().isoformat()
+    }
+    commit_change(data, {"op": "add", "user": username, "record": transaction})
+    print_json(transaction)
+
+def cli_where(data, username, args):
+    # Records matching --where and the other filter options
+    try:
+        found = query_transactions(data, username, args.where)
+    except ValueError as error:
+        raise SystemExit(f"error: invalid --where filter: {error}")
+    filters = cli_filters(args)
+    found = [t for t in found if matches_filters(t, **filters)]
+    if getattr(args, "order", None):
+        found.sort(key=lambda t: t["date"], reverse=args.order == "d")
+    return found
+
+def cli_list(data, username, args):
+    if args.recent:
+        rows = recent_transactions(data, username, args.recent)
+    elif args.where:
+        rows = cli_where(data, username, args)
+    else:
+        rows = iter_transactions(data, username, order=args.order, **cli_filters(args))
+    write_rows(sys.stdout, rows, TRANSACTION_KEYS, args.format)
+
+def cli_search(data, username, args):
+    write_rows(sys.stdout, search_transactions(data, username, " ".join(args.words)), TRANSACTION_KEYS, args.format)
+
+def cli_summary(data, username, args):
+    filters = cli_filters(args)
+    if args.by:
+        totals = None
+        if args.where or set(filters) - {"start", "end"}:
+            # group_totals() only narrows by date range, so other filters
+            # are applied to the records themselves
+            found = cli_where(data, username, args) if args.where else iter_transactions(data, username, **filters)
+            totals = aggregate(found, bucket=lambda t: bucket_of(data, args.by, t["date"]))["buckets"]
+            totals.pop(None, None)  # Malformed dates
+        write_rows(sys.stdout, summary_rows(data, username, args.by, args.start, args.end, totals), SUMMARY_FIELDS, args.format)
+        return
+    if args.where:
+        result = aggregate(cli_where(data, username, args))
+    else:
+        result = aggregate(iter_transactions(data, username, **filters))
+    categories = {"Income": {}, "Expense": {}}
+    for (type_, category), total in result["categories"].items():
+        categories.setdefault(type_, {})[category] = total
+    print_json({"income": result["types"]["Income"], "expense": result["types"]["Expense"],
+                "balance": round(result["types"]["Income"] - result["types"]["Expense"], 2),
+                "count": result["count"], "categories": categories})
+
+def cli_delete(data, username, args):
+    if args.all:
+        deleted = count_transactions(data, username)
+        commit_change(data, {"op": "clear", "user": username})
+    else:
+        ids = [t["id"] for t in find_transactions(data, username, date=args.date)] if args.date else \
+              [tid for tid in args.id if get_transaction(data, username, tid)]
+        deleted = len(ids)
+        if ids:
+            commit_change(data, {"op": "delete", "user": username, "ids": ids})
+    print_json({"deleted": deleted})
+
+def cli_import(data, username, args):
+    if not os.path.isfile(args.path):
+        raise SystemExit(f"error: file not found: {args.path}")
+    added, duplicates, rejected = import_csv(data, username, args.path)
+    print_json({"added": added, "duplicates": duplicates,
+                "rejected": [{"line": line, "reason": reason} for line, reason in rejected]})
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Expense & Savings Tracker. Run without a command for the interactive app.")
+    account = argparse.ArgumentParser(add_help=False)
+    account.add_argument("--user", required=True, help="username or email")
+    account.add_argument("--password", help="defaults to $WADSAET_PASSWORD")
+    filters = argparse.ArgumentParser(add_help=False)
+    filters.add_argument("--type", choices=list(CATEGORIES), help="Expense or Income")
+    filters.add_argument("--category")
+    filters.add_argument("--date", type=cli_date, help="a single day (YYYY-MM-DD)")
+    filters.add_argument("--start", type=cli_date, help="first day (YYYY-MM-DD)")
+    filters.add_argument("--end", type=cli_date, help="last day (YYYY-MM-DD)")
+    filters.add_argument("--where", help='filter expression, e.g. "category = Bills and amount > 100"')
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", parents=[account], help="add a record")
+    add.add_argument("--type", required=True, choices=list(CATEGORIES))
+    add.add_argument("--amount", required=True, type=cli_amount)
+    add.add_argument("--category", required=True)
+    add.add_argument("--date", type=cli_date, help="defaults to today")
+    add.add_argument("--description", default="N/A")
+    add.set_defaults(run=cli_add)
+
+    list_ = commands.add_parser("list", parents=[account, filters], help="print records")
+    list_.add_argument("--order", choices=["a", "d"], help="sort by date, ascending or descending")
+    list_.add_argument("--recent", type=cli_count, help="only the last N records")
+    list_.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl")
+    list_.set_defaults(run=cli_list)
+
+    summary = commands.add_parser("summary", parents=[account, filters], help="print totals")
+    summary.add_argument("--by", choices=list(GROUPINGS), help="one row per day, week, month, quarter or year")
+    summary.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl", help="with --by")
+    summary.set_defaults(run=cli_summary)
+
+    search = commands.add_parser("search", parents=[account], help="print records whose descriptions match")
+    search.add_argument("words", nargs="+", help="word prefixes that must all match")
+    search.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl")
+    search.set_defaults(run=cli_search)
+
+    delete = commands.add_parser("delete", parents=[account], help="delete records")
+    which = delete.add_mutually_exclusive_group(required=True)
+    which.add_argument("--id", type=int, nargs="+", help="transaction IDs")
+    which.add_argument("--date", type=cli_date, help="every record on this day")
+    which.add_argument("--all", action="store_true", help="every record")
+    delete.set_defaults(run=cli_delete)
+
+    import_ = commands.add_parser("import", parents=[account], help="import records from a CSV file")
+    import_.add_argument("path")
+    import_.set_defaults(run=cli_import)
+    return parser
+
+def run_cli(argv):
+    args = build_parser().parse_args(argv)
+    # One run at a time from load to the last write, so runs started
+    # together (e.g. from cron) see each other's changes
+    with data_lock:
+        data = load_data()
+        try:
+            args.run(data, cli_login(data, args), args)
+        finally:
+            flush_changes(data)
+            save_search_indexes(data)
+    return 0
 
 def main():
+    enable_ansi()
     data = load_data()
+    atexit.register(save_search_indexes, data)  # Runs last, after the flush below
+    atexit.register(flush_changes, data)  # Also covers Ctrl+C and crashes
+    atexit.register(screen.flush)
     while True:
         clear_terminal()
-        print(color("Expense & Savings Tracker", C.BOLD))
-        print(color("----------------", C.BOLD))
-        print(color("Track expenses and income.\nNo more disappearing Money!", C.DIM))
-        print()
+        screen.print(color("Expense & Savings Tracker", C.BOLD))
+        screen.print(color("----------------", C.BOLD))
+        screen.print(color("Track expenses and income.\nNo more disappearing Money!", C.DIM))
+        screen.print()
 
 
 
-        print(color("Please choose a function:", C.BOLD))
-        print(color("1. Sign Up", C.WHITE))
-        print(color("2. Login", C.WHITE))
-        print(color("3. Exit", C.WHITE))
+        screen.print(color("Please choose a function:", C.BOLD))
+        screen.print(color("1. Sign Up", C.WHITE))
+        screen.print(color("2. Login", C.WHITE))
+        screen.print(color("3. Exit", C.WHITE))
 
-        choice = input("Choose an option: ").strip()
+        choice = screen.input("Choose an option: ").strip()
 
         if choice == "1":
             sign_up(data)
+            flush_changes(data)
         elif choice == "2":
             user = login(data)
             if user:
                 dashboard(data, user)
         elif choice == "3":
-            print(color("👋 Goodbye! See you next time.", C.GRAY))
+            flush_changes(data)
+            screen.print(color("👋 Goodbye! See you next time.", C.GRAY))
+            screen.flush()
             break
         else:
-            print("Invalid choice.")
-            input("Press Enter to continue...")
+            screen.print("Invalid choice.")
+            screen.input("Press Enter to continue...")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
     main()
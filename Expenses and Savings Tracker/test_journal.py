@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import WADSAET
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.TemporaryDirectory()
+        os.chdir(self.dir.name)
+        with open(WADSAET.DATA_FILE, "w") as file:
+            json.dump({"users": {"tan": {"email": "tan@example.com", "password": "aA1"}}, "transactions": {"tan": []}}, file)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.dir.cleanup()
+
+    def add(self, description):
+        WADSAET.run_cli(["add", "--user", "tan", "--password", "aA1", "--type", "Income", "--amount", "5",
+                         "--category", "Work", "--description", description])
+
+    def descriptions(self):
+        data = WADSAET.load_data()
+        return [t["description"] for t in data["_storage"].transactions(data, "tan")]
+
+    def test_changes_after_a_torn_line_are_kept(self):
+        self.add("first")
+        with open(WADSAET.JOURNAL_FILE, "a") as file:
+            file.write('{"op":"add","user":"tan","rec')  # Write cut short by a crash
+        self.add("second")
+        self.add("third")
+        self.assertEqual(self.descriptions(), ["first", "second", "third"])
+
+
+if __name__ == "__main__":
+    unittest.main()